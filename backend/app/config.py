@@ -3,6 +3,69 @@ from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 UPLOAD_DIR = Path("data/pdfs")
+CATALOG_PATH = Path("data/textbooks.json")
 EMBEDDINGS_DIR = BASE_DIR / "data/embeddings"
-VECTOR_DB_DIR = BASE_DIR / "data/vector_store"
+VECTOR_DB_DIR = Path(os.getenv("VECTOR_STORE_PATH", BASE_DIR / "data/vector_store"))
 LMSTUDIO_API = os.getenv("LMSTUDIO_API", "http://localhost:1234/v1/chat/completions")
+
+# Several inference servers: comma-separated chat-completions URLs (defaults to LMSTUDIO_API)
+LMSTUDIO_APIS = [u.strip() for u in os.getenv("LMSTUDIO_APIS", LMSTUDIO_API).split(",") if u.strip()]
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "15"))  # seconds between /models probes
+LLM_EJECT_AFTER = int(os.getenv("LLM_EJECT_AFTER", "3"))  # consecutive failures before ejection
+
+# LLM admission control: calls running at once across the pool, and interactive / batch calls allowed to wait
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(4 * len(LMSTUDIO_APIS))))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_BATCH_QUEUE = int(os.getenv("LLM_MAX_BATCH_QUEUE", "256"))
+
+# Embedding model and chunking limits (MiniLM truncates input at 256 tokens)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Optional shared embedding/retrieval worker (see services/embedding_worker.py); the worker
+# unpickles requests, so the socket needs a secret authkey, which has no default
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET", "")
+EMBEDDING_AUTHKEY = os.getenv("EMBEDDING_AUTHKEY", "").encode()
+if EMBEDDING_SOCKET and not EMBEDDING_AUTHKEY:
+    raise RuntimeError("EMBEDDING_SOCKET is set but EMBEDDING_AUTHKEY is not; set it to a random secret")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_WAIT_MS = int(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+# Send prompt-cache hints (cache_prompt / prompt_cache_key) with LLM requests
+LLM_PROMPT_CACHE = os.getenv("LLM_PROMPT_CACHE", "0") == "1"
+
+# Ingest-time pruning (services/dedup.py): on/off, share of pages a header/footer line must repeat on,
+# and the estimated Jaccard similarity at which a page or chunk counts as a near-duplicate of an earlier one
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "1") == "1"
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.03"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+
+# Hierarchical summaries (services/summaries.py): build after every embed, LLM input size per leaf, parallel calls
+SUMMARY_TREE_AFTER_EMBED = os.getenv("SUMMARY_TREE_AFTER_EMBED", "0") == "1"
+SUMMARY_PIECE_TOKENS = int(os.getenv("SUMMARY_PIECE_TOKENS", "1500"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+
+# Few-shot tutor examples (services/fewshot.py): how many per chat (0 = off), their token budget, min similarity
+FEWSHOT_EXAMPLES_PATH = BASE_DIR / "app/prompts/tutor_examples.json"
+FEWSHOT_EXAMPLES = int(os.getenv("FEWSHOT_EXAMPLES", "3"))
+FEWSHOT_TOKEN_BUDGET = int(os.getenv("FEWSHOT_TOKEN_BUDGET", "400"))
+FEWSHOT_MIN_SCORE = float(os.getenv("FEWSHOT_MIN_SCORE", "0.35"))
+
+# Compressed vector search (services/vector_codes.py): none | float16 | int8, and candidates rescored exactly per result
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none").strip().lower()
+if VECTOR_COMPRESSION not in ("none", "float16", "int8"):
+    raise RuntimeError(f"VECTOR_COMPRESSION must be none, float16 or int8, not {VECTOR_COMPRESSION!r}")
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+# Textbook residency (services/residency.py): memory for in-process code indexes (0 = query Chroma directly),
+# hottest books preloaded at startup, and how fast old accesses stop counting
+INDEX_MEMORY_MB = int(os.getenv("INDEX_MEMORY_MB", "1024"))
+HOT_TEXTBOOKS = int(os.getenv("HOT_TEXTBOOKS", "5"))
+ACCESS_HALF_LIFE_DAYS = float(os.getenv("ACCESS_HALF_LIFE_DAYS", "7"))
+
+# Multi-textbook chat: most textbooks one question may search at once
+MAX_CHAT_TEXTBOOKS = int(os.getenv("MAX_CHAT_TEXTBOOKS", "5"))
+
+# Admin endpoints (/api/admin, e.g. the profiler) need this token in X-Admin-Token; unset = disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
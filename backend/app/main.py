@@ -1,7 +1,11 @@
+import threading
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import uploads, embed, chat, sessions, textbooks
+from app.routes import uploads, embed, chat, sessions, textbooks, llm, admin
 from app.config import UPLOAD_DIR
+from app.services import vector_store
+from app.services.profiler import ProfilingMiddleware
 
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -15,10 +19,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Idle unless an admin starts a profiling session (/api/admin/profile)
+app.add_middleware(ProfilingMiddleware)
 
 # Consistent API prefix for clarity and separation
 app.include_router(uploads.router, prefix="/api")
 app.include_router(embed.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
 app.include_router(sessions.router, prefix="/api")
-app.include_router(textbooks.router, prefix="/api")
\ No newline at end of file
+app.include_router(textbooks.router, prefix="/api")
+app.include_router(llm.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+
+@app.on_event("startup")
+def preload_hot_textbooks():
+    # Warm the most used textbooks without delaying startup
+    threading.Thread(target=vector_store.preload_hot_textbooks, daemon=True).start()
+
+@app.on_event("shutdown")
+def save_access_stats():
+    vector_store.resident.save_access()
@@ -1,10 +1,13 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class ChatQuery(BaseModel):
     query: str
     role: str
-    pdf_id: str
+    pdf_id: str = ""  # empty = answer from general knowledge
+    pdf_ids: Optional[List[str]] = None  # several textbooks searched together; overrides pdf_id
+    session_id: Optional[str] = None  # enables conversation memory
+    model: Optional[str] = None  # LLM to answer with; defaults to the server's current model
 
 class ChatResponse(BaseModel):
     answer: str
@@ -0,0 +1,48 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.config import ADMIN_TOKEN
+from app.services.profiler import profiler
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin API is disabled; set ADMIN_TOKEN to enable it.")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token.")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.post("/profile")
+def start_profile(
+    requests: Optional[int] = Query(None, ge=1, description="stop after this many requests"),
+    seconds: Optional[float] = Query(None, gt=0, description="stop after this long (default 30, max 600)"),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    memory: bool = Query(False, description="also trace allocations with tracemalloc"),
+):
+    """Sample the stacks of the next N requests or the next few seconds, grouped by route."""
+    try:
+        return profiler.start(requests, seconds, interval_ms, memory)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/profile")
+def profile_status():
+    """Progress of the running session, or the report of the last one."""
+    return profiler.status()
+
+@router.post("/profile/stop")
+def stop_profile():
+    report = profiler.stop()
+    if report is None:
+        raise HTTPException(status_code=404, detail="No profile has been recorded.")
+    return report
+
+@router.get("/profile/collapsed", response_class=PlainTextResponse)
+def collapsed_stacks(route: Optional[str] = None):
+    """Last session's stacks in folded format, for flamegraph.pl or speedscope; `route` filters by substring."""
+    if profiler.report is None:
+        raise HTTPException(status_code=404, detail="No profile has been recorded.")
+    return profiler.collapsed_stacks(route)
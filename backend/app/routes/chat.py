@@ -1,10 +1,18 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from app.models.chat_model import ChatQuery, ChatResponse
 from app.services import rag_agent
+from app.services.llm_scheduler import QueueFull
+from app.config import MAX_CHAT_TEXTBOOKS
 
 router = APIRouter(prefix="/chat")
 
 @router.post("/", response_model=ChatResponse)
-def ask_question(payload: ChatQuery):  # ✅ renamed from 'query' to 'payload'
-    print("📩 PDF ID:", payload.pdf_id)
-    return rag_agent.get_rag_response(payload)
\ No newline at end of file
+async def ask_question(payload: ChatQuery):  # ✅ renamed from 'query' to 'payload'
+    books = rag_agent.books_of(payload)
+    print("📩 PDF ID:", ", ".join(books))
+    if len(books) > MAX_CHAT_TEXTBOOKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CHAT_TEXTBOOKS} textbooks per question.")
+    try:
+        return await rag_agent.get_rag_response(payload)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
\ No newline at end of file
@@ -1,17 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pathlib import Path
 import traceback
 
-from app.services import pdf_utils, embedding, vector_store
-from app.config import UPLOAD_DIR
+from app.services import pdf_utils, embedding, vector_store, catalog, summaries
+from app.config import UPLOAD_DIR, SUMMARY_TREE_AFTER_EMBED
 
 router = APIRouter(prefix="/embed", tags=["embed"])
 
 @router.post("/{pdf_id}")
-async def embed_pdf(pdf_id: str):
+async def embed_pdf(pdf_id: str, background_tasks: BackgroundTasks):
     """
     Given a pdf_id (without .pdf extension), load the file,
     extract & clean text into chunks, embed them, and persist to vector store.
+    Re-embedding only encodes chunks whose content hash isn't stored yet.
     """
     # 1) Locate the PDF on disk
     pdf_path = UPLOAD_DIR / f"{pdf_id}.pdf"
@@ -24,16 +25,11 @@ async def embed_pdf(pdf_id: str):
         if not chunks:
             raise HTTPException(status_code=400, detail="No text chunks extracted from PDF.")
         
-        # 3) Embed all chunks
-        vectors = embedding.get_embeddings(chunks)
-        if not vectors or len(vectors) != len(chunks):
-            raise HTTPException(
-                status_code=500,
-                detail=f"Embedding failure: expected {len(chunks)} vectors, got {len(vectors) if vectors is not None else 0}."
-            )
+        # Keep the detected chapter TOC for prompts
+        catalog.update_textbook(pdf_id, chapters=metadata.get("chapters", []))
 
-        # 4) Persist to your vector store
-        vector_store.save_vectors(pdf_id, chunks, vectors)
+        # 3) Embed only new chunks; drop vanished ones, keep the rest
+        summary = vector_store.sync_vectors(pdf_id, chunks, embedding.encode)
 
     except HTTPException:
         # re-raise known HTTP errors
@@ -44,5 +40,34 @@ async def embed_pdf(pdf_id: str):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Embedding failed: {e}")
 
+    # 4) Optionally precompute the summary tree once the response is sent
+    if SUMMARY_TREE_AFTER_EMBED:
+        _schedule_summaries(pdf_id, pdf_path, background_tasks)
+
     # 5) All done!
-    return {"status": "embedded", "chunks": len(chunks)}
\ No newline at end of file
+    return {"status": "embedded", "chunks": len(chunks), **summary,
+            **({"pruned": metadata["pruned"]} if "pruned" in metadata else {})}
+
+def _schedule_summaries(pdf_id: str, pdf_path: Path, background_tasks: BackgroundTasks) -> bool:
+    if summaries.jobs.get(pdf_id, {}).get("status") in ("queued", "running"):
+        return False
+    summaries.jobs[pdf_id] = {"status": "queued"}
+    background_tasks.add_task(summaries.run_job, pdf_id, pdf_path)
+    return True
+
+@router.post("/{pdf_id}/summaries")
+def build_summaries(pdf_id: str, background_tasks: BackgroundTasks):
+    """
+    Build (or refresh) the chunk -> section -> chapter -> book summary tree
+    in the background. Only nodes whose input changed call the LLM again.
+    """
+    pdf_path = UPLOAD_DIR / f"{pdf_id}.pdf"
+    if not pdf_path.exists():
+        raise HTTPException(status_code=404, detail="PDF file not found.")
+    if not _schedule_summaries(pdf_id, pdf_path, background_tasks):
+        raise HTTPException(status_code=409, detail="Summary tree is already being built.")
+    return {"status": "queued"}
+
+@router.get("/{pdf_id}/summaries")
+def summaries_status(pdf_id: str):
+    return summaries.jobs.get(pdf_id, {"status": "not started"})
\ No newline at end of file
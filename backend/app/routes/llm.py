@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from app.services.llm_pool import pool
+from app.services.llm_scheduler import scheduler
+
+router = APIRouter(prefix="/llm")
+
+@router.get("/backends")
+def list_backends():
+    """Health, load and latency of each configured LLM backend"""
+    return pool.stats()
+
+@router.get("/models")
+def list_models():
+    return pool.models()
+
+@router.get("/scheduler")
+def scheduler_stats():
+    """Active and queued LLM calls, admissions/rejections and queue-wait percentiles per priority"""
+    return scheduler.stats()
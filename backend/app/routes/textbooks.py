@@ -1,8 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 import os
 import json
+import shutil
+import tempfile
 from pathlib import Path
 
+from app.config import UPLOAD_DIR
+from app.services import catalog, maintenance, snapshots, summaries, vector_store
+
 router = APIRouter()
 
 @router.get("/textbooks")
@@ -65,4 +72,62 @@ def list_textbooks():
         print(f"Error reading PDF directory: {e}")
         raise HTTPException(status_code=500, detail="Failed to read PDF directory")
     
-    return files
\ No newline at end of file
+    return files
+
+@router.get("/textbooks/{pdf_id}/snapshot")
+def export_snapshot(pdf_id: str, include_pdf: bool = True):
+    """Download one embedded textbook as a portable snapshot file."""
+    tmp = tempfile.NamedTemporaryFile(suffix=".tbsnap", delete=False)
+    tmp.close()
+    try:
+        snapshots.export_snapshot(pdf_id, Path(tmp.name), include_pdf=include_pdf)
+    except snapshots.SnapshotError as e:
+        os.unlink(tmp.name)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        os.unlink(tmp.name)
+        print(f"❌ Snapshot export of {pdf_id} failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Snapshot export failed: {e}")
+    return FileResponse(tmp.name, media_type="application/zip", filename=f"{pdf_id}.tbsnap",
+                        background=BackgroundTask(os.unlink, tmp.name))
+
+@router.post("/textbooks/snapshot")
+def import_snapshot(file: UploadFile = File(...), replace: bool = False):
+    """
+    Load a snapshot made by GET /textbooks/{pdf_id}/snapshot: chunks, vectors,
+    summaries and catalog entry, without re-embedding.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".tbsnap") as tmp:
+        shutil.copyfileobj(file.file, tmp)
+        tmp.flush()
+        try:
+            return snapshots.import_snapshot(Path(tmp.name), replace=replace)
+        except snapshots.SnapshotError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileExistsError as e:
+            raise HTTPException(status_code=409, detail=f"{e} Pass replace=true to overwrite it.")
+
+@router.get("/textbooks/residency")
+def residency_stats():
+    """Which textbook indexes are in memory, hit/miss/eviction counts and the hottest books."""
+    return vector_store.resident.stats()
+
+@router.delete("/textbooks/{pdf_id}")
+def delete_textbook(pdf_id: str):
+    """Remove a textbook: its PDF, catalog entry, chunk and summary vectors."""
+    known = (catalog.get_textbook(pdf_id) is not None or (UPLOAD_DIR / f"{pdf_id}.pdf").exists()
+             or pdf_id in vector_store.collection_names())
+    if not known:
+        raise HTTPException(status_code=404, detail="Textbook not found.")
+    if summaries.jobs.get(pdf_id, {}).get("status") in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="A summary tree is being built for this textbook.")
+    summaries.jobs.pop(pdf_id, None)
+    return maintenance.delete_textbook(pdf_id)
+
+@router.post("/textbooks/maintenance")
+def run_maintenance(dry_run: bool = False):
+    """
+    Delete orphaned PDFs, catalog entries and collections, then compact the
+    vector store. Returns what was found and the bytes reclaimed.
+    """
+    return maintenance.run_maintenance(dry_run=dry_run)
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import shutil, uuid, os, json
-from pathlib import Path
+import shutil, uuid
 import fitz  # PyMuPDF
 from app.config import UPLOAD_DIR
+from app.services import catalog
 
 router = APIRouter()
 
@@ -36,26 +36,15 @@ async def upload_pdf(file: UploadFile = File(...)):
         author = "Unknown"
         page_count = "?"
 
-    # Load or create metadata file
-    metadata_path = Path("data/textbooks.json")
-    metadata = {}
-    if metadata_path.exists():
-        with open(metadata_path) as f:
-            metadata = json.load(f)
-
-    # Update metadata for this PDF
-    metadata[file_uuid] = {
-        "title": title,
-        "author": author,
-        "pages": page_count,
-        "chapters": [],
-        "original_name": orig_name
-    }
-
-    # Save updated metadata
-    metadata_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(metadata_path, "w") as f:
-        json.dump(metadata, f, indent=2)
+    # Record the PDF in the textbook catalog
+    catalog.update_textbook(
+        file_uuid,
+        title=title,
+        author=author,
+        pages=page_count,
+        chapters=[],
+        original_name=orig_name,
+    )
 
     # ✅ Return clean response to frontend
     return {
@@ -0,0 +1,235 @@
+"""
+Bulk ingestion: every PDF under a directory -> catalog + vector store.
+
+PDFs are extracted and chunked in a process pool while the main process
+encodes. Chunks from several documents are encoded in one call, so the model
+always gets full batches, and each document's vectors are then written in
+bulk. Progress goes to a checkpoint manifest after every encode batch. Re-running
+the same command skips finished files. Interrupted ones keep their pdf_id and
+only encode the chunks that never reached the store.
+
+    python -m app.services.bulk_ingest /path/to/course --workers 4
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import UPLOAD_DIR
+
+MANIFEST_NAME = ".ingest_manifest.json"
+
+def file_hash(path: Path) -> str:
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            sha.update(block)
+    return sha.hexdigest()
+
+def extract(path: str) -> Dict[str, Any]:
+    """Pool worker: chunks and catalog fields of one PDF."""
+    import fitz  # PyMuPDF
+    from app.services import pdf_utils
+
+    start = time.perf_counter()
+    chunks, metadata = pdf_utils.extract_and_clean(Path(path))
+    with fitz.open(path) as doc:
+        pages = len(doc)
+    return {"path": path, "chunks": chunks, "metadata": metadata, "pages": pages,
+            "seconds": time.perf_counter() - start}
+
+class Manifest:
+    """Checkpoint file: source path -> {sha1, pdf_id, status, ...}, rewritten atomically."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = json.loads(path.read_text()) if path.exists() else {"files": {}}
+
+    @property
+    def files(self) -> Dict[str, Dict]:
+        return self.data["files"]
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.data, indent=2))
+        os.replace(tmp, self.path)
+
+class BulkIngester:
+    def __init__(self, root: Path, manifest: Manifest, workers: int, batch_chunks: int,
+                 retry_failed: bool = False):
+        from app.services import catalog, embedding, vector_store  # loads the model
+
+        self.catalog, self.embedding, self.vector_store = catalog, embedding, vector_store
+        self.root = root
+        self.manifest = manifest
+        self.workers = workers
+        self.batch_chunks = batch_chunks
+        self.retry_failed = retry_failed
+        self.pending: List[Dict] = []  # extracted docs waiting for a full encode batch
+        self.totals = {"files": 0, "skipped": 0, "failed": 0, "pages": 0, "chunks": 0, "encoded": 0,
+                       "pruned_lines": 0, "pruned_chunks": 0,
+                       "extract_cpu_s": 0.0, "encode_s": 0.0, "store_s": 0.0}
+
+    def todo(self) -> List[Path]:
+        """PDFs under root that aren't recorded as done with the same content."""
+        paths, seen = [], {e["sha1"]: p for p, e in self.manifest.files.items() if e.get("status") == "done"}
+        for path in sorted(self.root.rglob("*.pdf")):
+            key = str(path.resolve())
+            entry = self.manifest.files.get(key, {})
+            digest = file_hash(path)
+            if entry.get("sha1") == digest and (entry.get("status") == "done" or
+                                                (entry.get("status") == "failed" and not self.retry_failed)):
+                # failed files wait for --retry-failed, so one bad PDF doesn't stall every run
+                self.totals["skipped"] += 1
+                continue
+            if seen.get(digest, key) != key:
+                print(f"⏭️ {path.name} is a copy of {Path(seen[digest]).name}, skipping")
+                self.totals["skipped"] += 1
+                continue
+            seen[digest] = key
+            # an interrupted or changed file keeps its pdf_id, so the sync is incremental
+            self.manifest.files[key] = {"sha1": digest, "pdf_id": entry.get("pdf_id") or str(uuid.uuid4()),
+                                        "status": "queued"}
+            paths.append(path)
+        self.manifest.save()
+        return paths
+
+    def register(self, doc: Dict):
+        """Copy the PDF next to uploaded ones and add its catalog entry, as routes/uploads.py does."""
+        entry = self.manifest.files[doc["path"]]
+        pdf_id, path = entry["pdf_id"], Path(doc["path"])
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, UPLOAD_DIR / f"{pdf_id}.pdf")
+        meta = doc["metadata"]
+        self.catalog.update_textbook(
+            pdf_id,
+            title=meta.get("title") or path.stem,
+            author=meta.get("author") or "Unknown",
+            pages=doc["pages"],
+            chapters=meta.get("chapters", []),
+            original_name=path.stem,
+        )
+        doc["plan"] = self.vector_store.plan_sync(pdf_id, doc["chunks"])
+        entry.update(status="registered", pages=doc["pages"], chunks=len(doc["chunks"]))
+        pruned = meta.get("pruned", {})
+        self.totals["pruned_lines"] += pruned.get("boilerplate_lines", 0)
+        self.totals["pruned_chunks"] += pruned.get("duplicate_chunks", 0)
+        self.totals["extract_cpu_s"] += doc["seconds"]
+        self.pending.append(doc)
+
+    def flush(self, force: bool = False):
+        """Encode pending docs' new chunks in one call, then write each doc's vectors."""
+        waiting = sum(len(d["plan"]["new_texts"]) for d in self.pending)
+        if not self.pending or (waiting < self.batch_chunks and not force):
+            return
+        texts = [t for d in self.pending for t in d["plan"]["new_texts"]]
+        start = time.perf_counter()
+        try:
+            vectors = self.embedding.encode(texts) if texts else None
+        except Exception as e:
+            # the batch can't be told apart; its docs wait for --retry-failed like extraction failures
+            for doc in self.pending:
+                self.fail(doc["path"], e)
+            self.pending.clear()
+            return
+        self.totals["encode_s"] += time.perf_counter() - start
+        self.totals["encoded"] += len(texts)
+
+        offset = 0
+        for doc in self.pending:
+            n = len(doc["plan"]["new_texts"])
+            start = time.perf_counter()
+            try:
+                summary = self.vector_store.apply_sync(doc["plan"], vectors[offset:offset + n] if n else None)
+            except Exception as e:
+                self.fail(doc["path"], e)
+                continue
+            finally:
+                self.totals["store_s"] += time.perf_counter() - start
+                offset += n
+            self.manifest.files[doc["path"]].update(status="done", **summary)
+            self.totals["files"] += 1
+            self.totals["pages"] += doc["pages"]
+            self.totals["chunks"] += len(doc["chunks"])
+        self.pending.clear()
+        self.manifest.save()
+        print(f"📚 {self.totals['files']} PDFs ingested, {self.totals['encoded']} chunks encoded")
+
+    def fail(self, path: str, error: Exception):
+        print(f"❌ {Path(path).name}: {error}")
+        self.manifest.files[path].update(status="failed", error=str(error))
+        self.totals["failed"] += 1
+        self.manifest.save()
+
+    def run(self) -> Dict[str, Any]:
+        paths = self.todo()
+        print(f"🔎 {len(paths)} PDFs to ingest ({self.totals['skipped']} done or skipped) with {self.workers} workers")
+        start = time.perf_counter()
+        # spawn: workers only import pdf_utils, never the embedding model of this process
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            queue, running = list(paths), {}
+            while queue or running:
+                # keep a couple of documents per worker extracted ahead of the encoder
+                while queue and len(running) < 2 * self.workers:
+                    path = str(queue.pop(0).resolve())
+                    running[pool.submit(extract, path)] = path
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = running.pop(future)
+                    try:
+                        doc = future.result()
+                        if not doc["chunks"]:
+                            raise ValueError("no text chunks extracted")
+                        self.register(doc)
+                    except Exception as e:
+                        self.fail(path, e)
+                self.flush()
+            self.flush(force=True)
+        except KeyboardInterrupt:
+            self.manifest.save()
+            raise SystemExit(f"⏸️ Interrupted after {self.totals['files']} PDFs; "
+                             f"run the same command again to resume.")
+        finally:
+            # nothing is left running after a normal run; on errors, don't wait for queued extractions
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        elapsed = time.perf_counter() - start
+        report = {**self.totals, "seconds": round(elapsed, 2),
+                  "pages_per_s": round(self.totals["pages"] / elapsed, 1) if elapsed else 0,
+                  "chunks_per_s": round(self.totals["chunks"] / elapsed, 1) if elapsed else 0}
+        for key in ("extract_cpu_s", "encode_s", "store_s"):
+            report[key] = round(report[key], 2)
+        self.manifest.data["last_run"] = report
+        self.manifest.save()
+        print(f"✅ Ingested {report['files']} PDFs ({report['pages']} pages, {report['chunks']} chunks) in "
+              f"{report['seconds']}s: {report['pages_per_s']} pages/s, {report['chunks_per_s']} chunks/s; "
+              f"extract {report['extract_cpu_s']}s CPU in workers, encode {report['encode_s']}s, "
+              f"store {report['store_s']}s; pruned {report['pruned_lines']} header/footer lines and "
+              f"{report['pruned_chunks']} near-duplicate chunks; {report['skipped']} skipped, {report['failed']} failed")
+        return report
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="extraction processes")
+    parser.add_argument("--batch-chunks", type=int, default=512,
+                        help="encode once at least this many chunks are waiting")
+    parser.add_argument("--manifest", type=Path, help=f"checkpoint file (default: <directory>/{MANIFEST_NAME})")
+    parser.add_argument("--retry-failed", action="store_true", help="also retry files that failed before")
+    args = parser.parse_args(argv)
+
+    if not args.directory.is_dir():
+        parser.exit(1, f"❌ {args.directory} is not a directory\n")
+    manifest = Manifest(args.manifest or args.directory / MANIFEST_NAME)
+    BulkIngester(args.directory, manifest, max(1, args.workers), args.batch_chunks, args.retry_failed).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from app.config import CATALOG_PATH
+
+# textbooks.json is read-modify-written by several routes; serialize writers
+_lock = threading.Lock()
+_cache = {"mtime": None, "data": {}}
+
+def load_catalog() -> Dict[str, dict]:
+    """All textbook entries keyed by pdf_id, re-read only when the file changes."""
+    try:
+        mtime = CATALOG_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _cache["mtime"] != mtime:
+        try:
+            with open(CATALOG_PATH) as f:
+                _cache["data"] = json.load(f)
+        except json.JSONDecodeError as e:
+            print(f"Warning: Could not load metadata: {e}")
+            _cache["data"] = {}
+        _cache["mtime"] = mtime
+    return _cache["data"]
+
+def get_textbook(pdf_id: str) -> Optional[dict]:
+    meta = load_catalog().get(pdf_id)
+    return meta if isinstance(meta, dict) else None
+
+def _write(metadata: Dict[str, dict]):
+    CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = CATALOG_PATH.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, CATALOG_PATH)
+
+def update_textbook(pdf_id: str, **fields) -> dict:
+    """Create or update one catalog entry and write the file back."""
+    with _lock:
+        metadata = dict(load_catalog())
+        entry = metadata.get(pdf_id)
+        entry = dict(entry) if isinstance(entry, dict) else {}
+        entry.update(fields)
+        metadata[pdf_id] = entry
+        _write(metadata)
+        return entry
+
+def remove_textbook(pdf_id: str) -> bool:
+    """Drop one catalog entry; False if there was none."""
+    with _lock:
+        metadata = dict(load_catalog())
+        if metadata.pop(pdf_id, None) is None:
+            return False
+        _write(metadata)
+        return True
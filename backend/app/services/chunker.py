@@ -0,0 +1,163 @@
+import copy
+import re
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from app.config import EMBEDDING_MODEL, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+Span = Tuple[int, int]
+Tokens = Tuple[np.ndarray, np.ndarray]  # token (starts, ends) as character offsets
+
+# Sentence boundary: . ? ! followed by whitespace
+TERMINATORS = np.array([ord(c) for c in ".?!"], dtype=np.uint32)
+WHITESPACE = re.compile(r"\s")
+# Rough word-piece approximation, only used when the real tokenizer can't be loaded
+APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# [CLS] and [SEP] are added by the model on top of the chunk's own tokens
+SPECIAL_TOKENS = 2
+# Text is tokenized this many characters at a time (cut at whitespace), so memory
+# stays bounded however large the book is
+WINDOW_CHARS = 1 << 18
+
+@lru_cache(maxsize=1)
+def _load_tokenizer():
+    """Load the fast tokenizer that matches the embedding model, or None if unavailable."""
+    name = EMBEDDING_MODEL if "/" in EMBEDDING_MODEL else f"sentence-transformers/{EMBEDDING_MODEL}"
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+        # the raw backend keeps tokenizer.json's truncation (128 for MiniLM) and
+        # padding, which PreTrainedTokenizerFast only switches off per call
+        backend = copy.deepcopy(tokenizer.backend_tokenizer)
+        backend.no_truncation()
+        backend.no_padding()
+        return backend
+    except Exception as e:
+        print(f"⚠️ Tokenizer for {name} unavailable ({e}); using approximate token counts")
+        return None
+
+SPACE, WORD, PUNCT = 0, 1, 2  # character classes, as re's \s and \w see them
+
+@lru_cache(maxsize=1)
+def _class_table() -> np.ndarray:
+    """Character class of every BMP code point."""
+    chars = [chr(i) for i in range(0x10000)]
+    return np.array([SPACE if c.isspace() else WORD if c.isalnum() or c == "_" else PUNCT for c in chars],
+                    dtype=np.uint8)
+
+@lru_cache(maxsize=1)  # tokenizing and sentence detection both classify the same window
+def _classify(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(code points, character classes) of text."""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    classes = _class_table()[np.minimum(codes, 0xFFFF)]
+    for i in np.flatnonzero(codes > 0xFFFF):  # rare: emoji, historic scripts
+        c = text[i]
+        classes[i] = SPACE if c.isspace() else WORD if c.isalnum() else PUNCT
+    return codes, classes
+
+def _approx_tokens(text: str) -> Tokens:
+    """APPROX_TOKEN's matches as offset arrays, without a match object per token."""
+    _, classes = _classify(text)
+    word, punct = classes == WORD, classes == PUNCT
+    prev_word = np.concatenate(([False], word[:-1]))
+    next_word = np.concatenate((word[1:], [False]))
+    return (np.flatnonzero(word & ~prev_word | punct),
+            np.flatnonzero(word & ~next_word | punct) + 1)
+
+def token_arrays(text: str) -> Tokens:
+    """Character (starts, ends) of every model token in text, in one pass."""
+    tokenizer = _load_tokenizer()
+    if tokenizer is None:
+        return _approx_tokens(text)
+    encoding = tokenizer.encode(text, add_special_tokens=False)
+    if encoding.overflowing:
+        # a truncating tokenizer would silently turn a whole book into one chunk
+        raise RuntimeError(f"Tokenizer truncated the text after {len(encoding.offsets)} tokens")
+    offsets = np.array(encoding.offsets, dtype=np.int64).reshape(-1, 2)
+    return offsets[:, 0], offsets[:, 1]
+
+def token_offsets(text: str) -> List[Span]:
+    """Character (start, end) offsets of every model token in text."""
+    starts, ends = token_arrays(text)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def _sentence_starts(text: str, ends: np.ndarray) -> np.ndarray:
+    """Indices of tokens that open a sentence: the previous token ends in . ? ! followed by whitespace."""
+    if len(ends) < 2:
+        return np.zeros(0, dtype=np.int64)
+    codes, classes = _classify(text)
+    before = ends[:-1]
+    return np.flatnonzero(np.isin(codes[before - 1], TERMINATORS) & (classes[before] == SPACE)) + 1
+
+def _window_end(text: str, start: int, size: int) -> int:
+    """End of the window from start: the first whitespace at or after start + size."""
+    if start + size >= len(text):
+        return len(text)
+    m = WHITESPACE.search(text, start + size)
+    return m.start() if m else len(text)
+
+def chunk_spans(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+                overlap: int = CHUNK_OVERLAP_TOKENS,
+                tokenize: Callable[[str], Tokens] = token_arrays,
+                window_chars: int = WINDOW_CHARS) -> List[Span]:
+    """
+    Split text into (start, end) character spans of at most max_tokens model tokens.
+
+    Chunks end on a sentence boundary whenever one fits, and each chunk after the
+    first starts roughly `overlap` tokens before the previous one ended (snapped
+    forward to a sentence start when possible). The text is tokenized a window
+    at a time; each window starts where the previous one's next chunk begins,
+    so spans are the same as tokenizing everything at once.
+    """
+    budget = max(1, max_tokens - SPECIAL_TOKENS)
+    overlap = max(0, min(overlap, budget - 1))
+
+    spans: List[Span] = []
+    base, size = 0, window_chars
+    while base < len(text):
+        cut = _window_end(text, base, size)
+        last = cut == len(text)
+        window = text[base:cut]
+        starts, ends = tokenize(window)
+        n = len(starts)
+        if not last and n <= budget:
+            size *= 2  # too few tokens to place even one chunk; widen and retry
+            continue
+        if n == 0:
+            break
+        sentence_ends = _sentence_starts(window, ends)
+
+        pos = 0
+        while True:
+            limit = min(pos + budget, n)
+            if limit == n and not last:
+                break  # this chunk may reach into the next window
+            if limit == n:
+                end = n
+            else:
+                # Last sentence boundary inside the budget, else a hard cut
+                i = int(np.searchsorted(sentence_ends, limit, "right")) - 1
+                end = int(sentence_ends[i]) if i >= 0 and sentence_ends[i] > pos else limit
+            spans.append((base + int(starts[pos]), base + int(ends[end - 1])))
+            if end == n:
+                break
+
+            # Step back for overlap, preferring to restart at a sentence start
+            nxt = max(end - overlap, pos + 1)
+            i = int(np.searchsorted(sentence_ends, nxt, "left"))
+            if overlap and i < len(sentence_ends) and sentence_ends[i] < end:
+                nxt = int(sentence_ends[i])
+            pos = nxt
+        if last:
+            break
+        base += int(starts[pos])
+        size = window_chars
+    return spans
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS,
+               overlap: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Token-bounded, overlapping chunks of text (see chunk_spans)."""
+    return [text[s:e] for s, e in chunk_spans(text, max_tokens, overlap)]
@@ -0,0 +1,121 @@
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from app.config import BOILERPLATE_MIN_SHARE, NEAR_DUPLICATE_THRESHOLD
+
+# Textbook PDFs repeat running headers, footers (page numbers, copyright
+# lines) and templated exercises on every page. Two passes drop them before
+# anything is embedded:
+#  - boilerplate lines: digit-masked lines that recur on many pages, among
+#    the first/last EDGE_LINES lines of a page (headers, footers), or
+#    anywhere on it if long enough that prose wouldn't repeat it by chance
+#    (notices, exercise templates)
+#  - near-duplicate pages and chunks: MinHash signatures over word shingles,
+#    bucketed by LSH bands; a page or chunk whose estimated Jaccard similarity
+#    with an earlier kept one reaches the threshold is dropped. Pages catch
+#    reflowed templates that chunk boundaries would cut differently each time.
+
+EDGE_LINES = 3
+MIN_PAGES = 4  # short documents: a line must still repeat on this many pages
+BODY_MIN_CHARS = 40  # lines away from the edges only count if this long
+SHINGLE_WORDS = 3  # signature() combines exactly three neighbours
+PERMUTATIONS = 64
+BANDS = 16  # 4 rows each: pairs from ~0.5 Jaccard up become candidates
+
+DIGITS = re.compile(r"\d+")
+WORD = re.compile(r"\w+")
+
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 2**32, PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2**32, PERMUTATIONS, dtype=np.uint64)
+_MASK = np.uint64(0xFFFFFFFF)
+_MIX = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))  # combine word hashes into shingles
+
+def _line_key(line: str) -> str:
+    """'Page 12' and 'Page 13' are the same footer."""
+    return DIGITS.sub("#", " ".join(line.lower().split()))
+
+def _edges(lines: List[str]) -> List[int]:
+    """Indices of the first and last EDGE_LINES non-blank lines."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:EDGE_LINES] + filled[-EDGE_LINES:]))
+
+def _keyed(page: str) -> Tuple[List[str], Dict[int, str], Dict[int, str]]:
+    """(lines, edge line keys, long line keys) of one page, by line index."""
+    lines = page.split("\n")
+    edge = {i: _line_key(lines[i]) for i in _edges(lines)}
+    # masking and collapsing spaces only shorten a line, so short raw lines can be skipped
+    body = {i: key for i, line in enumerate(lines) if len(line) >= BODY_MIN_CHARS
+            and len(key := edge.get(i) or _line_key(line)) >= BODY_MIN_CHARS}
+    return lines, edge, body
+
+def boilerplate_keys(keyed: List[Tuple], min_share: float = BOILERPLATE_MIN_SHARE) -> Tuple[Set[str], Set[str]]:
+    """Digit-masked lines repeated on enough pages: (at page edges, anywhere)."""
+    edge_counts, body_counts = Counter(), Counter()
+    for _, edge, body in keyed:
+        edge_counts.update(set(edge.values()))
+        body_counts.update(set(body.values()))
+    need = max(MIN_PAGES, min_share * len(keyed))
+    return ({key for key, n in edge_counts.items() if n >= need and key},
+            {key for key, n in body_counts.items() if n >= need})
+
+def strip_boilerplate(pages: List[str], min_share: float = BOILERPLATE_MIN_SHARE) -> Tuple[List[str], Dict]:
+    """Pages without their repeated header/footer lines, and what was removed."""
+    keyed = [_keyed(page) for page in pages]
+    edge_keys, body_keys = boilerplate_keys(keyed, min_share)
+    if not edge_keys and not body_keys:
+        return pages, {"boilerplate_lines": 0, "boilerplate_chars": 0, "boilerplate_patterns": []}
+    out, removed, chars = [], 0, 0
+    for page, (lines, edge, body) in zip(pages, keyed):
+        drop = {i for i, key in edge.items() if key in edge_keys} | \
+               {i for i, key in body.items() if key in body_keys}
+        if not drop:
+            out.append(page)
+            continue
+        removed += len(drop)
+        chars += sum(len(lines[i]) for i in drop)
+        out.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return out, {"boilerplate_lines": removed, "boilerplate_chars": chars,
+                 "boilerplate_patterns": sorted(edge_keys | body_keys)[:20]}
+
+def signature(text: str) -> np.ndarray:
+    """MinHash of the text's word 3-shingles: PERMUTATIONS 32-bit minima."""
+    # a stable hash (not the per-process salted hash()), so every run and
+    # every bulk-ingest worker keeps the same chunks
+    tokens = WORD.findall(text.lower())
+    codes = {w: zlib.crc32(w.encode("utf-8")) for w in set(tokens)}
+    words = np.array([codes[w] for w in tokens] or [0], dtype=np.uint64)
+    if len(words) >= SHINGLE_WORDS:
+        words = words[:-2] * _MIX[0] ^ words[1:-1] * _MIX[1] ^ words[2:]
+    shingles = np.unique((words ^ (words >> np.uint64(32))) & _MASK)
+    # (a * h + b) mod 2^32 per permutation; uint64 wraparound keeps the low 32 bits right
+    return ((np.outer(_A, shingles) + _B[:, None]) & _MASK).min(axis=1)
+
+def near_duplicates(chunks: List[str], threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List[int]:
+    """Indices of texts that near-duplicate an earlier kept one, in order."""
+    rows = PERMUTATIONS // BANDS
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    signatures, duplicates = [], []
+    for i, chunk in enumerate(chunks):
+        sig = signature(chunk)
+        signatures.append(sig)
+        bands = [(b, sig[b * rows:(b + 1) * rows].tobytes()) for b in range(BANDS)]
+        candidates = {j for band in bands for j in buckets.get(band, ())}
+        if any(np.count_nonzero(signatures[j] == sig) >= threshold * PERMUTATIONS for j in candidates):
+            duplicates.append(i)
+            continue
+        for band in bands:
+            buckets.setdefault(band, []).append(i)
+    return duplicates
+
+def drop_near_duplicates(texts: List[str], threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                         kind: str = "chunks") -> Tuple[List[str], Dict]:
+    """Texts without near-duplicates, and how many were dropped (as duplicate_<kind>)."""
+    duplicates = set(near_duplicates(texts, threshold))
+    kept = [t for i, t in enumerate(texts) if i not in duplicates]
+    return kept, {f"duplicate_{kind}": len(duplicates),
+                  f"duplicate_{kind}_chars": sum(len(texts[i]) for i in duplicates)}
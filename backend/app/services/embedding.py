@@ -1,6 +1,24 @@
-from sentence_transformers import SentenceTransformer
+import numpy as np
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from app.config import EMBEDDING_MODEL, EMBEDDING_SOCKET
+
+if EMBEDDING_SOCKET:
+    # Model lives in the shared embedding worker
+    from app.services.embedding_worker import WorkerConnection
+    model = None
+    worker = WorkerConnection(EMBEDDING_SOCKET)
+else:
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    worker = None
+
+def encode(chunks) -> np.ndarray:
+    """Embeddings as one contiguous float32 array, shape (len(chunks), dim)."""
+    if worker is not None:
+        vectors = worker.embed(chunks)
+    else:
+        vectors = model.encode(chunks, convert_to_numpy=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
 
 def get_embeddings(chunks):
-    return model.encode(chunks, convert_to_tensor=False).tolist()
+    return encode(chunks).tolist()
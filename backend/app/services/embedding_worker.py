@@ -0,0 +1,223 @@
+"""
+Shared embedding/retrieval worker.
+
+Holds the one SentenceTransformer and the one Chroma PersistentClient for a
+node and serves them over a Unix socket, so uvicorn can run many HTTP workers
+without each loading torch, the model and its own store client.
+
+    export EMBEDDING_AUTHKEY=$(openssl rand -hex 32)
+    python -m app.services.embedding_worker            # start the worker
+    EMBEDDING_SOCKET=/tmp/drax-embed.sock uvicorn app.main:app --workers 4
+
+Requests are pickled, so whoever can connect can run code in the worker.
+The socket is therefore owner-only (0600) and every connection must know
+EMBEDDING_AUTHKEY; run the worker and the web workers as the same user.
+
+When EMBEDDING_SOCKET is set, embedding.py and vector_store.py use the
+clients below instead of loading anything themselves.
+"""
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import List
+
+from app.config import (
+    EMBEDDING_MODEL, VECTOR_DB_DIR, EMBEDDING_SOCKET, EMBEDDING_AUTHKEY,
+    EMBED_BATCH_SIZE, EMBED_BATCH_WAIT_MS,
+)
+
+# Chroma client / collection methods callers are allowed to reach remotely
+CLIENT_METHODS = {"get_or_create_collection", "get_collection", "delete_collection", "list_collections"}
+COLLECTION_METHODS = {"add", "get", "query", "delete", "update", "upsert", "count", "peek", "modify"}
+
+class RemoteError(RuntimeError):
+    """An exception raised inside the worker that couldn't be sent back as-is."""
+
+# ——— Client side (web workers) ———
+
+class WorkerConnection:
+    """One connection per thread; Connection objects are not thread-safe."""
+
+    def __init__(self, address: str = EMBEDDING_SOCKET, authkey: bytes = EMBEDDING_AUTHKEY):
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def call(self, *request):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        try:
+            conn.send(request)
+            ok, result = conn.recv()
+        except (EOFError, OSError):
+            # Worker restarted; drop the dead connection so the next call reconnects
+            self._local.conn = None
+            raise
+        if not ok:
+            raise result
+        return result
+
+    def embed(self, texts: List[str]):
+        return self.call("embed", list(texts))
+
+class RemoteCollection:
+    """Stands in for a chromadb Collection; every method runs in the worker."""
+
+    def __init__(self, conn: WorkerConnection, name: str):
+        self._conn = conn
+        self.name = name
+
+    def __getattr__(self, method):
+        if method not in COLLECTION_METHODS:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._conn.call("collection", self.name, method, args, kwargs)
+
+class RemoteChromaClient:
+    """Stands in for chromadb.PersistentClient in vector_store."""
+
+    def __init__(self, conn: WorkerConnection):
+        self._conn = conn
+
+    def get_or_create_collection(self, name, **kwargs):
+        self._conn.call("client", "get_or_create_collection", (name,), kwargs)
+        return RemoteCollection(self._conn, name)
+
+    def get_collection(self, name, **kwargs):
+        self._conn.call("client", "get_collection", (name,), kwargs)
+        return RemoteCollection(self._conn, name)
+
+    def delete_collection(self, name):
+        self._conn.call("client", "delete_collection", (name,), {})
+
+    def list_collections(self):
+        names = self._conn.call("client", "list_collections", (), {})
+        return [RemoteCollection(self._conn, n) for n in names]
+
+# ——— Server side (the worker process) ———
+
+class _EmbedJob:
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class EmbeddingWorker:
+    def __init__(self, batch_size: int = EMBED_BATCH_SIZE, batch_wait_ms: int = EMBED_BATCH_WAIT_MS):
+        import chromadb
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(EMBEDDING_MODEL)
+        self.client = chromadb.PersistentClient(path=str(VECTOR_DB_DIR))
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.jobs = queue.Queue()
+
+    def _batch_loop(self):
+        """Merge jobs arriving within the wait window into one encode() call."""
+        while True:
+            jobs = [self.jobs.get()]
+            total = len(jobs[0].texts)
+            deadline = time.monotonic() + self.batch_wait
+            while total < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self.jobs.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                total += len(job.texts)
+
+            texts = [t for job in jobs for t in job.texts]
+            try:
+                vectors = self.model.encode(texts, convert_to_tensor=False)
+                start = 0
+                for job in jobs:
+                    job.result = vectors[start:start + len(job.texts)]
+                    start += len(job.texts)
+            except Exception as e:
+                for job in jobs:
+                    job.error = e
+            for job in jobs:
+                job.done.set()
+            if len(jobs) > 1:
+                print(f"🧮 Encoded {len(texts)} texts from {len(jobs)} requests in one batch")
+
+    def handle(self, request):
+        kind = request[0]
+        if kind == "embed":
+            job = _EmbedJob(request[1])
+            self.jobs.put(job)
+            job.done.wait()
+            if job.error:
+                raise job.error
+            return job.result
+        if kind == "client":
+            _, method, args, kwargs = request
+            if method not in CLIENT_METHODS:
+                raise ValueError(f"Method not allowed: {method}")
+            result = getattr(self.client, method)(*args, **kwargs)
+            if method == "list_collections":
+                return [getattr(c, "name", c) for c in result]
+            return None
+        if kind == "collection":
+            _, name, method, args, kwargs = request
+            if method not in COLLECTION_METHODS:
+                raise ValueError(f"Method not allowed: {method}")
+            return getattr(self.client.get_collection(name), method)(*args, **kwargs)
+        raise ValueError(f"Unknown request: {kind}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = (True, self.handle(request))
+                except Exception as e:
+                    reply = (False, e)
+                try:
+                    conn.send(reply)
+                except Exception:
+                    # Unpicklable result or exception
+                    conn.send((False, RemoteError(repr(reply[1]))))
+
+    def serve(self, address: str = EMBEDDING_SOCKET, authkey: bytes = EMBEDDING_AUTHKEY):
+        if not authkey:
+            raise RuntimeError("EMBEDDING_AUTHKEY must be set to a secret before starting the worker")
+        if os.path.lexists(address):
+            os.unlink(address)
+        # bind with an owner-only umask so the socket is never connectable by others, even briefly
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        finally:
+            os.umask(umask)
+        os.chmod(address, 0o600)
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        with listener:
+            print(f"🚀 Embedding worker listening on {address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"❌ Rejected connection: {e}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared embedding/retrieval worker")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET or "/tmp/drax-embed.sock")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--batch-wait-ms", type=int, default=EMBED_BATCH_WAIT_MS)
+    args = parser.parse_args()
+    EmbeddingWorker(args.batch_size, args.batch_wait_ms).serve(args.socket)
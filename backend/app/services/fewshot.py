@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+from app.config import FEWSHOT_EXAMPLES, FEWSHOT_EXAMPLES_PATH, FEWSHOT_MIN_SCORE, FEWSHOT_TOKEN_BUDGET
+from app.services.chunker import token_offsets
+
+# Few-shot tutor examples are embedded once (by question) into a small
+# float16 matrix next to tutor_examples.json. Each chat only gets the few
+# examples closest to its question that fit the token budget.
+
+INDEX_PATH = FEWSHOT_EXAMPLES_PATH.with_suffix(".npz")
+
+def example_hash(example: Dict) -> str:
+    return hashlib.sha1(f"{example['question']}\n{example['answer']}".encode("utf-8")).hexdigest()
+
+def _read_index(index_path: Path) -> Dict[str, np.ndarray]:
+    if not index_path.exists():
+        return {}
+    with np.load(index_path) as data:
+        return {h.decode(): v for h, v in zip(data["hashes"], data["vectors"])}
+
+def build_index(examples: Iterable[Dict], embed_fn: Callable[[List[str]], List],
+                index_path: Path = INDEX_PATH, batch: int = 256) -> Dict[str, int]:
+    """
+    Write the example index, embedding only examples it doesn't hold yet.
+    `examples` is consumed as a stream; removed examples drop out.
+    """
+    old = _read_index(index_path)
+    hashes, vectors, pending = [], [], []
+    stats = {"examples": 0, "embedded": 0, "reused": 0}
+
+    def flush():
+        if not pending:
+            return
+        embedded = embed_fn([q for _, q in pending])
+        for (row, _), vec in zip(pending, embedded):
+            vectors[row] = np.asarray(vec, dtype=np.float32)
+        stats["embedded"] += len(pending)
+        pending.clear()
+
+    seen = set()
+    for example in examples:
+        h = example_hash(example)
+        if h in seen:
+            continue
+        seen.add(h)
+        hashes.append(h)
+        if h in old:
+            vectors.append(old[h].astype(np.float32))
+            stats["reused"] += 1
+        else:
+            vectors.append(None)
+            pending.append((len(vectors) - 1, example["question"]))
+            if len(pending) >= batch:
+                flush()
+    flush()
+
+    matrix = np.stack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    if len(matrix):
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    tmp = index_path.with_name(index_path.name + ".tmp.npz")
+    np.savez(tmp, hashes=np.array(hashes, dtype="S40"), vectors=matrix.astype(np.float16))
+    os.replace(tmp, index_path)
+
+    stats["examples"] = len(hashes)
+    stats["removed"] = len(set(old) - seen)
+    print(f"🧩 Few-shot index {index_path.name}: {stats}")
+    return stats
+
+class FewShotIndex:
+    def __init__(self, examples_path: Path, index_path: Path):
+        with open(examples_path, encoding="utf-8") as f:
+            by_hash = {example_hash(e): e for e in json.load(f)}
+        with np.load(index_path) as data:
+            keep = [i for i, h in enumerate(data["hashes"]) if h.decode() in by_hash]
+            self.examples = [by_hash[data["hashes"][i].decode()] for i in keep]
+            self.vectors = data["vectors"][keep]
+        self.tokens = [len(token_offsets(f"{e['question']}\n{e['answer']}")) for e in self.examples]
+
+    def select(self, query_vec, n: int, token_budget: int, min_score: float) -> List[Dict]:
+        """Most similar examples first, skipping any that would overflow the budget."""
+        if n <= 0 or not self.examples:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32)
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        scores = self.vectors @ q
+        k = min(len(scores), n * 4)
+        top = np.argpartition(-scores, k - 1)[:k]
+        chosen, used = [], 0
+        for i in top[np.argsort(-scores[top])]:
+            if scores[i] < min_score:
+                break
+            if used + self.tokens[i] > token_budget:
+                continue
+            chosen.append(self.examples[i])
+            used += self.tokens[i]
+            if len(chosen) == n:
+                break
+        return chosen
+
+@lru_cache(maxsize=1)
+def _load(examples_mtime: float, index_mtime: float) -> FewShotIndex:
+    return FewShotIndex(FEWSHOT_EXAMPLES_PATH, INDEX_PATH)
+
+def select_examples(query_vec, n: int = FEWSHOT_EXAMPLES, token_budget: int = FEWSHOT_TOKEN_BUDGET,
+                    min_score: float = FEWSHOT_MIN_SCORE) -> List[Dict]:
+    """Up to n relevant examples for a query embedding; [] if there is no index yet."""
+    if n <= 0:
+        return []
+    try:
+        index = _load(FEWSHOT_EXAMPLES_PATH.stat().st_mtime, INDEX_PATH.stat().st_mtime)
+    except FileNotFoundError:
+        return []
+    return index.select(query_vec, n, token_budget, min_score)
@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import requests
+
+from app.config import LMSTUDIO_APIS, LLM_HEALTH_INTERVAL, LLM_EJECT_AFTER
+
+class Backend:
+    """One OpenAI-compatible inference server and its live counters."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.models_url = f"{url.replace('/chat/completions', '')}/models"
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0  # consecutive
+        self.models: List[str] = []  # empty = not probed yet, accept any model
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.last_error = ""
+        self.last_probe = None
+
+    def serves(self, model: Optional[str]) -> bool:
+        return not model or not self.models or model in self.models
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "avg_latency": self.total_latency / self.requests if self.requests else 0.0,
+            "models": self.models,
+            "last_error": self.last_error,
+            "last_probe": self.last_probe,
+        }
+
+class LLMPool:
+    """
+    Routes each LLM call to the healthy backend with the fewest outstanding
+    requests that serves the requested model. A backend is ejected after
+    LLM_EJECT_AFTER consecutive failures and readmitted when a /models
+    probe succeeds; probes run every LLM_HEALTH_INTERVAL seconds.
+    """
+
+    def __init__(self, urls: List[str], health_interval: float = LLM_HEALTH_INTERVAL,
+                 eject_after: int = LLM_EJECT_AFTER):
+        self.backends = [Backend(u) for u in urls]
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def acquire(self, model: Optional[str] = None) -> Backend:
+        self._start_prober()
+        with self._lock:
+            healthy = [b for b in self.backends if b.healthy]
+            # Prefer a healthy server that lists the model, then any healthy one
+            # (LM Studio answers with whatever is loaded); if all are ejected,
+            # try them anyway rather than fail outright
+            candidates = [b for b in healthy if b.serves(model)] or healthy or self.backends
+            least = min(b.outstanding for b in candidates)
+            backend = random.choice([b for b in candidates if b.outstanding == least])
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, ok: bool, latency: float, error: str = ""):
+        with self._lock:
+            backend.outstanding -= 1
+            backend.total_latency += latency
+            if ok:
+                backend.failures = 0
+                return
+            backend.errors += 1
+            backend.failures += 1
+            backend.last_error = error
+            if backend.healthy and backend.failures >= self.eject_after:
+                backend.healthy = False
+                print(f"🚫 Ejected LLM backend {backend.url} after {backend.failures} failures: {error}")
+
+    @contextmanager
+    def lease(self, model: Optional[str] = None):
+        """with pool.lease(model) as call: ...; call["ok"]/["error"] decide the backend's health"""
+        backend = self.acquire(model)
+        call = {"backend": backend, "ok": False, "error": ""}
+        start = time.time()
+        try:
+            yield call
+        except Exception as e:
+            call["error"] = call["error"] or str(e)
+            raise
+        except BaseException:
+            # Cancelled on our side (client went away): not the backend's fault
+            call["ok"] = True
+            raise
+        finally:
+            self.release(backend, call["ok"], time.time() - start, call["error"])
+
+    def probe(self, backend: Backend):
+        try:
+            r = requests.get(backend.models_url, timeout=5)
+            r.raise_for_status()
+            models = [m["id"] for m in r.json().get("data", [])]
+            ok, error = True, ""
+        except Exception as e:
+            models, ok, error = None, False, str(e)
+
+        with self._lock:
+            backend.last_probe = time.time()
+            if ok:
+                backend.models = models
+                backend.failures = 0
+                if not backend.healthy:
+                    backend.healthy = True
+                    print(f"✅ Readmitted LLM backend {backend.url}")
+            else:
+                backend.last_error = error
+                if backend.healthy:
+                    backend.healthy = False
+                    print(f"🚫 Ejected LLM backend {backend.url}: health probe failed ({error})")
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _start_prober(self):
+        if self._prober is not None or self.health_interval <= 0:
+            return
+        with self._lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="llm-health", daemon=True)
+        self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            self.probe_all()
+            time.sleep(self.health_interval)
+
+    def models(self) -> List[str]:
+        """Models advertised by healthy backends, in first-seen order."""
+        seen = {}
+        for b in self.backends:
+            if b.healthy:
+                seen.update(dict.fromkeys(b.models))
+        return list(seen)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [b.snapshot() for b in self.backends]
+
+pool = LLMPool(LMSTUDIO_APIS)
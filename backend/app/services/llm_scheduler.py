@@ -0,0 +1,174 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from app.config import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_MAX_BATCH_QUEUE
+
+# Lower number runs first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class QueueFull(Exception):
+    """Raised instead of queueing when the caller's priority class already has its maximum waiting."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+class _Ticket:
+    def __init__(self, priority: str, session: str, loop=None):
+        self.priority = priority
+        self.session = session
+        self.enqueued = time.perf_counter()
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+class LLMScheduler:
+    """
+    Admission control in front of the LLM pool. At most max_concurrent calls
+    run at once; the rest wait in priority order (interactive before batch),
+    round-robin across sessions within a priority so one busy session can't
+    starve the others. Each priority has its own queue limit, so a batch
+    backlog never turns interactive calls away; past its limit a new call
+    fails fast with QueueFull carrying a Retry-After estimate.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE,
+                 max_batch_queue: int = LLM_MAX_BATCH_QUEUE):
+        self.max_concurrent = max_concurrent
+        self.max_queue = {"interactive": max_queue, "batch": max_batch_queue}
+        self._lock = threading.Lock()
+        self._active = 0
+        # priority -> session -> FIFO of tickets; session order rotates
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {p: OrderedDict() for p in PRIORITIES}
+        self._queued = 0
+        self._waiting = {p: 0 for p in PRIORITIES}  # queued tickets per priority
+        self._service = deque(maxlen=200)  # recent call durations, for Retry-After
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITIES}
+        self.counters = {p: {"admitted": 0, "rejected": 0} for p in PRIORITIES}
+
+    def _enqueue(self, priority: str, session: Optional[str], loop=None) -> Optional[_Ticket]:
+        """Take a slot now (returns None) or queue a ticket; raises QueueFull."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queued:
+                self._active += 1
+                self.counters[priority]["admitted"] += 1
+                self._waits[priority].append(0.0)
+                return None
+            if self._waiting[priority] >= self.max_queue[priority]:
+                self.counters[priority]["rejected"] += 1
+                raise QueueFull(self._retry_after(priority))
+            ticket = _Ticket(priority, session or "anonymous", loop)
+            self._queues[priority].setdefault(ticket.session, deque()).append(ticket)
+            self._queued += 1
+            self._waiting[priority] += 1
+            return ticket
+
+    def _dispatch(self):
+        """Hand free slots to the next tickets. Caller holds the lock."""
+        while self._active < self.max_concurrent and self._queued:
+            for priority in sorted(PRIORITIES, key=PRIORITIES.get):
+                sessions = self._queues[priority]
+                if sessions:
+                    break
+            session, tickets = next(iter(sessions.items()))
+            ticket = tickets.popleft()
+            # Move this session to the back so others get the next turn
+            del sessions[session]
+            if tickets:
+                sessions[session] = tickets
+            self._queued -= 1
+            self._waiting[priority] -= 1
+            self._active += 1
+            self.counters[priority]["admitted"] += 1
+            self._waits[priority].append(time.perf_counter() - ticket.enqueued)
+            ticket.grant()
+
+    def _cancel(self, ticket: _Ticket):
+        """Drop a ticket whose caller gave up; give its slot back if it was granted meanwhile."""
+        with self._lock:
+            tickets = self._queues[ticket.priority].get(ticket.session)
+            if tickets and ticket in tickets:
+                tickets.remove(ticket)
+                if not tickets:
+                    del self._queues[ticket.priority][ticket.session]
+                self._queued -= 1
+                self._waiting[ticket.priority] -= 1
+                return
+        self._release(0.0)
+
+    def _release(self, duration: float):
+        with self._lock:
+            self._active -= 1
+            if duration:
+                self._service.append(duration)
+            self._dispatch()
+
+    def _retry_after(self, priority: str) -> int:
+        # a new call waits behind its own class and every class above it, never below
+        ahead = sum(n for p, n in self._waiting.items() if PRIORITIES[p] <= PRIORITIES[priority])
+        avg = sum(self._service) / len(self._service) if self._service else 1.0
+        return max(1, math.ceil((ahead + 1) * avg / self.max_concurrent))
+
+    @contextmanager
+    def slot(self, priority: str = "interactive", session: Optional[str] = None):
+        """Block the calling thread until the call may run."""
+        ticket = self._enqueue(priority, session)
+        if ticket is not None:
+            ticket.event.wait()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def async_slot(self, priority: str = "interactive", session: Optional[str] = None):
+        """Await a slot without holding a thread while queued."""
+        ticket = self._enqueue(priority, session, asyncio.get_running_loop())
+        if ticket is not None:
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                self._cancel(ticket)
+                raise
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - start)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = {}
+            for p, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[p] = {
+                    "p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else 0.0,
+                    "p95_ms": ordered[int(len(ordered) * 0.95)] * 1000 if ordered else 0.0,
+                    "max_ms": ordered[-1] * 1000 if ordered else 0.0,
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": {p: sum(len(t) for t in q.values()) for p, q in self._queues.items()},
+                "counters": self.counters,
+                "queue_wait": waits,
+            }
+
+scheduler = LLMScheduler()
@@ -1,10 +1,14 @@
+import httpx
 import requests
 import json
 import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 from datetime import datetime
-from app.config import LMSTUDIO_API
+from app.config import LLM_PROMPT_CACHE
+from app.services.llm_pool import pool
+from app.services.llm_scheduler import scheduler, QueueFull
+from app.services.training_export import to_example, validate_file, finish_stats
 
 class ModelManager:
     def __init__(self):
@@ -14,23 +18,17 @@ class ModelManager:
         self.request_history = []
         
     def get_available_models(self) -> List[str]:
-        """Fetch available models from LM Studio"""
-        try:
-            response = requests.get(f"{LMSTUDIO_API.replace('/chat/completions', '')}/models")
-            if response.status_code == 200:
-                models_data = response.json()
-                self.available_models = [model["id"] for model in models_data.get("data", [])]
-                print(f"📋 Available models: {self.available_models}")
-                return self.available_models
-            else:
-                print(f"❌ Failed to fetch models: {response.status_code}")
-                return []
-        except Exception as e:
-            print(f"❌ Error fetching models: {e}")
-            return []
+        """Fetch available models from every healthy backend in the pool"""
+        pool.probe_all()
+        self.available_models = pool.models()
+        if self.available_models:
+            print(f"📋 Available models: {self.available_models}")
+        else:
+            print("❌ Failed to fetch models: no healthy LLM backend")
+        return self.available_models
     
     def switch_model(self, model_name: str) -> bool:
-        """Switch to a different model"""
+        """Switch the default model (requests can pass model=... instead)"""
         if not self.available_models:
             self.get_available_models()
         
@@ -46,24 +44,16 @@ class ModelManager:
 # Global model manager
 model_manager = ModelManager()
 
-def ask_local_llm(prompt: str, **kwargs) -> str:
-    """Enhanced LLM interaction with better error handling and features"""
-    
-    # Extract parameters
-    temperature = kwargs.get('temperature', 0.7)
-    max_tokens = kwargs.get('max_tokens', 2048)
-    model = kwargs.get('model', model_manager.current_model)
-    system_message = kwargs.get('system_message', "You are a helpful assistant.")
-    timeout = kwargs.get('timeout', 60)
-    
+def build_chat_payload(prompt: str, **kwargs) -> Dict:
+    """Chat-completions request body shared by the sync and async clients"""
     payload = {
-        "model": model,
+        "model": kwargs.get('model', model_manager.current_model),
         "messages": [
-            {"role": "system", "content": system_message},
+            {"role": "system", "content": kwargs.get('system_message', "You are a helpful assistant.")},
             {"role": "user", "content": prompt},
         ],
-        "temperature": temperature,
-        "max_tokens": max_tokens,
+        "temperature": kwargs.get('temperature', 0.7),
+        "max_tokens": kwargs.get('max_tokens', 2048),
         "stream": False,
     }
     
@@ -74,59 +64,130 @@ def ask_local_llm(prompt: str, **kwargs) -> str:
         payload['frequency_penalty'] = kwargs['frequency_penalty']
     if 'presence_penalty' in kwargs:
         payload['presence_penalty'] = kwargs['presence_penalty']
+    add_cache_hints(payload, kwargs.get('cache_key'))
+    return payload
+
+def ask_local_llm(prompt: str, **kwargs) -> str:
+    """Enhanced LLM interaction with better error handling and features"""
     
-    start_time = time.time()
+    payload = build_chat_payload(prompt, **kwargs)
+    timeout = kwargs.get('timeout', 60)
     
-    try:
-        print(f"🚀 Sending request to: {LMSTUDIO_API}")
-        print(f"🤖 Model: {model} | Temp: {temperature} | Max tokens: {max_tokens}")
-        
-        r = requests.post(LMSTUDIO_API, json=payload, timeout=timeout)
-        
-        response_time = time.time() - start_time
-        
-        # Log request for analytics
-        model_manager.request_history.append({
-            "timestamp": datetime.now().isoformat(),
-            "model": model,
-            "prompt_length": len(prompt),
-            "response_time": response_time,
-            "status_code": r.status_code
-        })
-        
-        # Check if request was successful
-        if r.status_code != 200:
-            print(f"❌ API Error - Status: {r.status_code}")
-            print(f"❌ Response: {r.text}")
-            return f"Error: API returned status {r.status_code}"
-        
-        # Parse JSON response
+    # Waits for the scheduler to admit the call, or raises QueueFull
+    with scheduler.slot(kwargs.get('priority', 'interactive'), kwargs.get('session')), \
+            pool.lease(payload["model"]) as call:
+        start_time = time.time()
+        url = call["backend"].url
         try:
-            response_json = r.json()
-            print(f"✅ Response received in {response_time:.2f}s")
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON Decode Error: {e}")
-            print(f"❌ Raw response text: {r.text}")
-            return "Error: Invalid JSON response from API"
-        
-        # Extract response content
-        response_content = extract_response_content(response_json)
-        
-        # Update model stats
-        update_model_stats(model, response_time, len(prompt), len(response_content))
-        
-        return response_content
-        
-    except requests.exceptions.ConnectionError:
-        print("❌ Connection Error: Cannot connect to LM Studio API")
-        print(f"❌ Check if LM Studio is running on {LMSTUDIO_API}")
-        return "Error: Cannot connect to LM Studio. Is it running?"
-    except requests.exceptions.Timeout:
-        print(f"❌ Timeout Error: LM Studio took longer than {timeout}s to respond")
-        return "Error: Request timed out"
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-        return f"Error: {str(e)}"
+            _log_request(payload, url)
+            r = requests.post(url, json=payload, timeout=timeout)
+            call["ok"] = r.status_code < 500
+            call["error"] = "" if call["ok"] else f"HTTP {r.status_code}"
+            return _read_response(r, payload, prompt, start_time)
+            
+        except requests.exceptions.ConnectionError:
+            call["error"] = "connection error"
+            print("❌ Connection Error: Cannot connect to LM Studio API")
+            print(f"❌ Check if LM Studio is running on {url}")
+            return "Error: Cannot connect to LM Studio. Is it running?"
+        except requests.exceptions.Timeout:
+            call["error"] = "timeout"
+            print(f"❌ Timeout Error: LM Studio took longer than {timeout}s to respond")
+            return "Error: Request timed out"
+        except Exception as e:
+            call["error"] = str(e)
+            print(f"❌ Unexpected error: {e}")
+            return f"Error: {str(e)}"
+
+# One pooled client per process; the event loop can wait on many requests at once
+_async_client: Optional[httpx.AsyncClient] = None
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=None, max_keepalive_connections=32))
+    return _async_client
+
+async def ask_local_llm_async(prompt: str, **kwargs) -> str:
+    """Non-blocking ask_local_llm for async routes; same payload, errors and stats"""
+    
+    payload = build_chat_payload(prompt, **kwargs)
+    timeout = kwargs.get('timeout', 60)
+    
+    # Waits for the scheduler to admit the call, or raises QueueFull
+    async with scheduler.async_slot(kwargs.get('priority', 'interactive'), kwargs.get('session')):
+        with pool.lease(payload["model"]) as call:
+            start_time = time.time()
+            url = call["backend"].url
+            try:
+                _log_request(payload, url)
+                r = await _get_async_client().post(url, json=payload, timeout=timeout)
+                call["ok"] = r.status_code < 500
+                call["error"] = "" if call["ok"] else f"HTTP {r.status_code}"
+                return _read_response(r, payload, prompt, start_time)
+            
+            except httpx.ConnectError:
+                call["error"] = "connection error"
+                print("❌ Connection Error: Cannot connect to LM Studio API")
+                print(f"❌ Check if LM Studio is running on {url}")
+                return "Error: Cannot connect to LM Studio. Is it running?"
+            except httpx.TimeoutException:
+                call["error"] = "timeout"
+                print(f"❌ Timeout Error: LM Studio took longer than {timeout}s to respond")
+                return "Error: Request timed out"
+            except Exception as e:
+                call["error"] = str(e)
+                print(f"❌ Unexpected error: {e}")
+                return f"Error: {str(e)}"
+
+def _log_request(payload: Dict, url: str):
+    print(f"🚀 Sending request to: {url}")
+    print(f"🤖 Model: {payload['model']} | Temp: {payload['temperature']} | Max tokens: {payload['max_tokens']}")
+
+def _read_response(r, payload: Dict, prompt: str, start_time: float) -> str:
+    """Record analytics and pull the answer out of a requests/httpx response"""
+    model = payload["model"]
+    response_time = time.time() - start_time
+    
+    # Log request for analytics
+    model_manager.request_history.append({
+        "timestamp": datetime.now().isoformat(),
+        "model": model,
+        "prompt_length": len(prompt),
+        "response_time": response_time,
+        "status_code": r.status_code
+    })
+    
+    # Check if request was successful
+    if r.status_code != 200:
+        print(f"❌ API Error - Status: {r.status_code}")
+        print(f"❌ Response: {r.text}")
+        return f"Error: API returned status {r.status_code}"
+    
+    # Parse JSON response
+    try:
+        response_json = r.json()
+        print(f"✅ Response received in {response_time:.2f}s")
+    except json.JSONDecodeError as e:
+        print(f"❌ JSON Decode Error: {e}")
+        print(f"❌ Raw response text: {r.text}")
+        return "Error: Invalid JSON response from API"
+    
+    # Extract response content
+    response_content = extract_response_content(response_json)
+    
+    # Update model stats
+    update_model_stats(model, response_time, len(prompt), len(response_content))
+    
+    return response_content
+
+def add_cache_hints(payload: Dict, cache_key: Optional[str]):
+    """Ask the server to keep the prompt's KV cache (llama.cpp/LM Studio, OpenAI-style key)"""
+    if not LLM_PROMPT_CACHE:
+        return
+    payload["cache_prompt"] = True
+    if cache_key:
+        payload["prompt_cache_key"] = cache_key
 
 def extract_response_content(response_json: Dict) -> str:
     """Extract content from various response formats"""
@@ -190,29 +251,52 @@ def ask_streaming_llm(prompt: str, **kwargs):
         "max_tokens": kwargs.get('max_tokens', 2048),
         "stream": True,
     }
+    add_cache_hints(payload, kwargs.get('cache_key'))
     
-    try:
-        response = requests.post(LMSTUDIO_API, json=payload, stream=True, timeout=60)
-        
-        for line in response.iter_lines():
-            if line:
-                line = line.decode('utf-8')
-                if line.startswith('data: '):
-                    try:
-                        data = json.loads(line[6:])
-                        if 'choices' in data and data['choices']:
-                            delta = data['choices'][0].get('delta', {})
-                            if 'content' in delta:
-                                yield delta['content']
-                    except json.JSONDecodeError:
-                        continue
-                        
-    except Exception as e:
-        print(f"❌ Streaming error: {e}")
-        yield f"Error: {str(e)}"
+    with scheduler.slot(kwargs.get('priority', 'interactive'), kwargs.get('session')), \
+            pool.lease(payload["model"]) as call:
+        try:
+            response = requests.post(call["backend"].url, json=payload, stream=True, timeout=60)
+            call["ok"] = response.status_code < 500
+            call["error"] = "" if call["ok"] else f"HTTP {response.status_code}"
+            
+            for line in response.iter_lines():
+                if line:
+                    line = line.decode('utf-8')
+                    if line.startswith('data: '):
+                        try:
+                            data = json.loads(line[6:])
+                            if 'choices' in data and data['choices']:
+                                delta = data['choices'][0].get('delta', {})
+                                if 'content' in delta:
+                                    yield delta['content']
+                        except json.JSONDecodeError:
+                            continue
+                            
+        except Exception as e:
+            call["ok"], call["error"] = False, str(e)
+            print(f"❌ Streaming error: {e}")
+            yield f"Error: {str(e)}"
+
+def ask_when_admitted(prompt: str, **kwargs) -> str:
+    """ask_local_llm for background jobs: waits out QueueFull instead of failing"""
+    while True:
+        try:
+            return ask_local_llm(prompt, **kwargs)
+        except QueueFull as e:
+            print(f"⏳ LLM queue full, retrying in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+def _ask(prompt: str, **kwargs) -> str:
+    """Batch-priority calls wait for admission; interactive ones fail fast"""
+    if kwargs.get('priority') == 'batch':
+        return ask_when_admitted(prompt, **kwargs)
+    return ask_local_llm(prompt, **kwargs)
 
 def batch_process_prompts(prompts: List[str], **kwargs) -> List[str]:
     """Process multiple prompts efficiently"""
+    # Evaluation runs yield to interactive chat
+    kwargs.setdefault('priority', 'batch')
     results = []
     total = len(prompts)
     
@@ -220,7 +304,7 @@ def batch_process_prompts(prompts: List[str], **kwargs) -> List[str]:
     
     for i, prompt in enumerate(prompts, 1):
         print(f"📝 Processing {i}/{total}")
-        result = ask_local_llm(prompt, **kwargs)
+        result = ask_when_admitted(prompt, **kwargs)
         results.append(result)
         
         # Optional delay between requests
@@ -230,88 +314,39 @@ def batch_process_prompts(prompts: List[str], **kwargs) -> List[str]:
     print(f"✅ Completed processing {total} prompts")
     return results
 
-def prepare_fine_tuning_data(conversations: List[Dict], output_path: str = "training_data.jsonl"):
-    """Prepare data for fine-tuning in JSONL format"""
-    training_examples = []
-    
-    for conv in conversations:
-        # Convert to chat format
-        example = {
-            "messages": [
-                {"role": "system", "content": conv.get("system", "You are a helpful assistant.")},
-                {"role": "user", "content": conv["input"]},
-                {"role": "assistant", "content": conv["output"]}
-            ]
-        }
-        training_examples.append(example)
-    
-    # Save as JSONL
+def prepare_fine_tuning_data(conversations: Iterable[Dict], output_path: str = "training_data.jsonl"):
+    """Prepare data for fine-tuning in JSONL format, writing each example as it is read"""
+    # Large exports: app.services.training_export (sharded, deduplicated, parallel validation)
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
     
+    total = 0
     with open(output_path, 'w', encoding='utf-8') as f:
-        for example in training_examples:
-            f.write(json.dumps(example, ensure_ascii=False) + '\n')
+        for conv in conversations:
+            f.write(json.dumps(to_example(conv), ensure_ascii=False) + '\n')
+            total += 1
     
     print(f"✅ Training data saved: {output_path}")
-    print(f"📊 Total examples: {len(training_examples)}")
+    print(f"📊 Total examples: {total}")
     
     return output_path
 
 def validate_training_data(file_path: str) -> Dict[str, Any]:
-    """Validate training data format and quality"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        examples = [json.loads(line) for line in f]
-    
-    stats = {
-        "total_examples": len(examples),
-        "avg_input_length": 0,
-        "avg_output_length": 0,
-        "format_errors": [],
-        "quality_issues": []
-    }
-    
-    input_lengths = []
-    output_lengths = []
-    
-    for i, example in enumerate(examples):
-        try:
-            messages = example["messages"]
-            user_msg = next(msg for msg in messages if msg["role"] == "user")
-            assistant_msg = next(msg for msg in messages if msg["role"] == "assistant")
-            
-            input_len = len(user_msg["content"])
-            output_len = len(assistant_msg["content"])
-            
-            input_lengths.append(input_len)
-            output_lengths.append(output_len)
-            
-            # Check for quality issues
-            if output_len < 10:
-                stats["quality_issues"].append(f"Example {i}: Very short response")
-            if input_len > 4000:
-                stats["quality_issues"].append(f"Example {i}: Very long input")
-                
-        except Exception as e:
-            stats["format_errors"].append(f"Example {i}: {str(e)}")
-    
-    if input_lengths:
-        stats["avg_input_length"] = sum(input_lengths) / len(input_lengths)
-        stats["avg_output_length"] = sum(output_lengths) / len(output_lengths)
+    """Validate training data format and quality, one line at a time"""
+    stats = finish_stats(validate_file(file_path))
     
     print(f"📊 Validation Results:")
     print(f"   Total examples: {stats['total_examples']}")
     print(f"   Avg input length: {stats['avg_input_length']:.1f}")
     print(f"   Avg output length: {stats['avg_output_length']:.1f}")
-    print(f"   Format errors: {len(stats['format_errors'])}")
-    print(f"   Quality issues: {len(stats['quality_issues'])}")
+    print(f"   Format errors: {stats['format_error_count']}")
+    print(f"   Quality issues: {stats['quality_issue_count']}")
     
     return stats
 
 def test_model_performance(test_cases: List[Dict], model: str = None) -> Dict:
     """Test model performance on specific cases"""
-    if model:
-        original_model = model_manager.current_model
-        model_manager.switch_model(model)
+    # Pass the model per request so concurrent users keep their own
+    llm_kwargs = {"model": model, "priority": "batch"} if model else {"priority": "batch"}
     
     results = {
         "total_tests": len(test_cases),
@@ -325,7 +360,7 @@ def test_model_performance(test_cases: List[Dict], model: str = None) -> Dict:
     
     for i, test_case in enumerate(test_cases):
         start_time = time.time()
-        response = ask_local_llm(test_case["input"])
+        response = ask_when_admitted(test_case["input"], **llm_kwargs)
         response_time = time.time() - start_time
         total_time += response_time
         
@@ -349,10 +384,6 @@ def test_model_performance(test_cases: List[Dict], model: str = None) -> Dict:
     
     results["avg_response_time"] = total_time / len(test_cases)
     
-    # Restore original model if changed
-    if model:
-        model_manager.switch_model(original_model)
-    
     print(f"🧪 Test Results: {results['passed']}/{results['total_tests']} passed")
     print(f"⏱️ Average response time: {results['avg_response_time']:.2f}s")
     
@@ -373,15 +404,15 @@ def export_conversation_logs(output_path: str = "conversation_logs.json"):
 def ask_with_context(question: str, context: str, **kwargs) -> str:
     """Ask a question with specific context"""
     prompt = f"Context: {context}\n\nQuestion: {question}\n\nAnswer:"
-    return ask_local_llm(prompt, **kwargs)
+    return _ask(prompt, **kwargs)
 
 def ask_for_summary(text: str, max_length: int = 200, **kwargs) -> str:
     """Generate a summary of given text"""
     prompt = f"Summarize the following text in no more than {max_length} words:\n\n{text}"
-    return ask_local_llm(prompt, **kwargs)
+    return _ask(prompt, **kwargs)
 
 def ask_multiple_choice(question: str, options: List[str], **kwargs) -> str:
     """Ask a multiple choice question"""
     options_text = "\n".join([f"{chr(65+i)}. {option}" for i, option in enumerate(options)])
     prompt = f"{question}\n\n{options_text}\n\nAnswer:"
-    return ask_local_llm(prompt, **kwargs)
\ No newline at end of file
+    return _ask(prompt, **kwargs)
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Textbook deletion and vector-store housekeeping.
+
+Finds what no textbook owns any more and removes it: PDFs with neither a
+catalog entry nor vectors, catalog entries with neither PDF nor vectors,
+and chunk/summary collections and code files of unknown books (including
+staging collections of snapshot imports that died). Then it compacts the Chroma
+directory: segment folders left behind by deleted collections are removed
+and chroma.sqlite3 is vacuumed. Conversation collections are never touched.
+
+    python -m app.services.maintenance --dry-run
+    python -m app.services.maintenance
+"""
+import argparse
+import json
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.config import UPLOAD_DIR, VECTOR_DB_DIR
+from app.services import catalog, snapshots, vector_store
+
+SEGMENT_DIR = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+def dir_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) if path.exists() else 0
+
+def delete_textbook(pdf_id: str) -> Dict[str, Any]:
+    """Remove a book's collections, code file, PDF and catalog entry."""
+    pdf_path = UPLOAD_DIR / f"{pdf_id}.pdf"
+    freed = dir_size(pdf_path) + dir_size(vector_store.codes_path(pdf_id))
+    collections = vector_store.delete_textbook_vectors(pdf_id)
+    pdf_removed = pdf_path.exists()
+    pdf_path.unlink(missing_ok=True)
+    in_catalog = catalog.remove_textbook(pdf_id)
+    vector_store.resident.forget(pdf_id)
+    report = {"pdf_id": pdf_id, "collections": collections, "pdf": pdf_removed,
+              "catalog": in_catalog, "bytes_freed": freed}
+    print(f"🗑️ Deleted textbook {pdf_id}: {report}")
+    return report
+
+def _book_id(collection: str) -> str:
+    return collection[:-len("_summaries")] if collection.endswith("_summaries") else collection
+
+def find_orphans() -> Dict[str, List[str]]:
+    """
+    Everything that no live textbook owns, grouped by kind. A book is live
+    if it has a catalog entry, or both a PDF and vectors (a lost catalog
+    entry shouldn't cost an embedded book).
+    """
+    books = set(catalog.load_catalog())
+    pdfs = {p.stem for p in UPLOAD_DIR.glob("*.pdf")}
+    now = time.time()
+    # a snapshot import still loading its staging collections looks just like an orphan
+    collections = [n for n in vector_store.collection_names() if not n.startswith("conversations_")
+                   and now - (snapshots.staging_started(_book_id(n)) or 0) > snapshots.STAGING_GRACE_S]
+    embedded = {n for n in collections if not n.endswith("_summaries")}
+    live = books | (pdfs & embedded)
+    codes = {p.stem for p in vector_store.CODES_DIR.glob("*.npz")} if vector_store.CODES_DIR.exists() else set()
+    return {
+        "pdfs": sorted(pdfs - live),
+        "catalog": sorted(b for b in books if b not in pdfs and b not in embedded),
+        "collections": sorted(n for n in collections if _book_id(n) not in live),
+        "codes": sorted(c for c in codes if c not in embedded or c not in live),
+    }
+
+def compact_store() -> Dict[str, int]:
+    """Drop segment folders no collection uses any more, then VACUUM chroma.sqlite3."""
+    # list folders before reading the segment table: a segment created in
+    # between is then always in the table, never mistaken for a leftover
+    folders = [p for p in VECTOR_DB_DIR.iterdir() if p.is_dir() and SEGMENT_DIR.fullmatch(p.name)]
+    db_path = VECTOR_DB_DIR / "chroma.sqlite3"
+    if not db_path.exists():
+        return {"segment_dirs": 0, "bytes_freed": 0}
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+        freed, removed = 0, 0
+        for folder in folders:
+            if folder.name not in live:
+                freed += dir_size(folder)
+                shutil.rmtree(folder, ignore_errors=True)
+                removed += 1
+        before = dir_size(db_path)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    freed += before - dir_size(db_path)
+    return {"segment_dirs": removed, "bytes_freed": freed}
+
+def run_maintenance(dry_run: bool = False) -> Dict[str, Any]:
+    """Delete orphans and compact the store; with dry_run, only report the orphans."""
+    start = time.time()
+    orphans = find_orphans()
+    report: Dict[str, Any] = {"dry_run": dry_run, "orphans": orphans}
+    if dry_run:
+        print(f"🔍 Orphans: { {k: len(v) for k, v in orphans.items()} }")
+        return report
+
+    before = dir_size(VECTOR_DB_DIR) + dir_size(UPLOAD_DIR)
+    for pdf_id in orphans["pdfs"]:
+        (UPLOAD_DIR / f"{pdf_id}.pdf").unlink(missing_ok=True)
+    for pdf_id in orphans["catalog"]:
+        catalog.remove_textbook(pdf_id)
+    for name in orphans["collections"]:
+        vector_store.client.delete_collection(name)
+    for pdf_id in orphans["codes"]:
+        vector_store.codes_path(pdf_id).unlink(missing_ok=True)
+    report["compaction"] = compact_store()
+    report["bytes_before"] = before
+    report["bytes_after"] = dir_size(VECTOR_DB_DIR) + dir_size(UPLOAD_DIR)
+    report["bytes_reclaimed"] = before - report["bytes_after"]
+    report["seconds"] = round(time.time() - start, 2)
+    print(f"🧹 Maintenance removed { {k: len(v) for k, v in orphans.items()} }, "
+          f"{report['compaction']['segment_dirs']} segment dirs; "
+          f"reclaimed {report['bytes_reclaimed'] / 2**20:.1f} MiB")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    parser.add_argument("--delete", metavar="PDF_ID", help="delete this textbook instead of running cleanup")
+    args = parser.parse_args()
+    report = delete_textbook(args.delete) if args.delete else run_maintenance(args.dry_run)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
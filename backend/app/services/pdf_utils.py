@@ -1,66 +1,64 @@
 import fitz  # PyMuPDF
 import re
-import emoji
 from pathlib import Path
+from app.config import INGEST_DEDUP
+from app.services import dedup as dedup_stage
+from app.services.chunker import chunk_text
+from app.utils.clean_text import normalize_pages, normalize_text
 
-def normalize_text(text: str) -> str:
-    """Remove URLs, emojis, control chars, collapse whitespace."""
-    text = re.sub(r"http\S+|www\S+", "", text)
-    text = emoji.replace_emoji(text, replace="")
-    text = re.sub(r"[\x00-\x1F]+", "", text)
-    return re.sub(r"\s+", " ", text).strip()
+# “Chapter 1: Intro” or “1.2 Section title”
+CHAPTER_LINE = re.compile(r'^(Chapter\s+\d+(?:\.\d+)*\b.*)', re.I)
+SECTION_LINE = re.compile(r'^(\d+\.\d+\s+.+)')
 
-def split_into_sentences(text: str) -> list[str]:
-    """Break on . ? ! followed by whitespace."""
-    parts = re.split(r'(?<=[\.!?])\s+', text)
-    return [p.strip() for p in parts if p.strip()]
+def find_chapters(txt: str, page_no: int, seen: set, chapters: list):
+    """Append TOC entries for heading lines on one page, skipping titles in seen."""
+    for line in txt.split("\n"):
+        line = line.strip()
+        m = CHAPTER_LINE.match(line) or SECTION_LINE.match(line)
+        if m:
+            title = m.group(1).strip()
+            if title not in seen:
+                seen.add(title)
+                chapters.append({"title": title, "page": page_no})
 
-def chunk_text(text: str, max_len: int = 500) -> list[str]:
-    """Accumulate sentences into ~500-char chunks."""
-    sentences = split_into_sentences(text)
-    chunks, current = [], ""
-    for sent in sentences:
-        if len(current) + len(sent) + 1 <= max_len:
-            current += sent + " "
-        else:
-            chunks.append(current.strip())
-            current = sent + " "
-    if current:
-        chunks.append(current.strip())
-    return chunks
-
-def extract_and_clean(pdf_path: Path):
+def extract_and_clean(pdf_path: Path, dedup: bool = INGEST_DEDUP):
     """
     Returns:
       chunks: list[str]
       metadata: {
         title: str,
         author: str,
-        chapters: [{ title: str, page: int }, …]
+        chapters: [{ title: str, page: int }, …],
+        pruned: { boilerplate_lines, duplicate_pages, duplicate_chunks, … }  (with dedup)
       }
     """
     doc = fitz.open(pdf_path)
-    full_text = ""
     seen = set()
     chapters = []
 
-    # build raw text + chapter TOC
-    for page_no, page in enumerate(doc, start=1):
-        txt = page.get_text()
-        full_text += txt + "\n"
-        for line in txt.split("\n"):
-            # match “Chapter 1: Intro” or “1.2 Section title”
-            m = re.match(r'^(Chapter\s+\d+(?:\.\d+)*\b.*)', line.strip(), re.I) \
-             or re.match(r'^(\d+\.\d+\s+.+)', line.strip())
-            if m:
-                title = m.group(1).strip()
-                if title not in seen:
-                    seen.add(title)
-                    chapters.append({"title": title, "page": page_no})
+    def page_texts():
+        # raw page text + chapter TOC, one page at a time
+        for page_no, page in enumerate(doc, start=1):
+            txt = page.get_text()
+            find_chapters(txt, page_no, seen, chapters)
+            yield txt
 
-    # normalize & chunk
-    cleaned = normalize_text(full_text)
+    # normalize each page as it is read, then chunk; with dedup, headers and
+    # footers need every page seen first, and repeated pages and chunks are dropped
+    pruned = {}
+    pages = page_texts()
+    if dedup:
+        pages, pruned = dedup_stage.strip_boilerplate(list(pages))
+        pages, dropped = dedup_stage.drop_near_duplicates(pages, kind="pages")
+        pruned.update(dropped)
+    cleaned = "".join(normalize_pages(pages))
     chunks = chunk_text(cleaned)
+    if dedup:
+        before = len(chunks)
+        chunks, dropped = dedup_stage.drop_near_duplicates(chunks)
+        pruned.update(dropped, chunks_before=before, chunks_after=len(chunks))
+        print(f"✂️ Pruned {pruned['boilerplate_lines']} header/footer lines, {pruned['duplicate_pages']} "
+              f"near-duplicate pages and {pruned['duplicate_chunks']} chunks ({before} -> {len(chunks)} chunks)")
 
     # collect doc-level metadata
     metadata = {
@@ -68,5 +66,21 @@ def extract_and_clean(pdf_path: Path):
         "author": doc.metadata.get("author", "").strip(),
         "chapters": chapters
     }
+    if dedup:
+        metadata["pruned"] = pruned
 
-    return chunks, metadata
\ No newline at end of file
+    return chunks, metadata
+
+def extract_pages(pdf_path: Path, dedup: bool = INGEST_DEDUP):
+    """Normalized text of each page, plus the chapter TOC as in extract_and_clean."""
+    doc = fitz.open(pdf_path)
+    seen = set()
+    chapters = []
+    pages = []
+    for page_no, page in enumerate(doc, start=1):
+        txt = page.get_text()
+        find_chapters(txt, page_no, seen, chapters)
+        pages.append(txt)
+    if dedup:
+        pages, _ = dedup_stage.strip_boilerplate(pages)
+    return [normalize_text(p) for p in pages], chapters
@@ -0,0 +1,260 @@
+import concurrent.futures.thread as pool_thread
+import contextvars
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# On-demand sampling profiler for live requests. While a session runs, a
+# background thread reads every thread's stack each interval and files it
+# under the API route it serves: the frame of an in-flight request's endpoint
+# names the route (sync endpoints in the threadpool, async ones on the event
+# loop), and work handed to asyncio.to_thread carries the request in its copied
+# context. When no session runs, the middleware costs one attribute check.
+#
+# cProfile only sees the thread that enables it, while most request work here
+# runs in to_thread workers, so sampling is used instead.
+
+REQUEST = contextvars.ContextVar("profiled_request", default=None)  # the ASGI scope
+MAX_DEPTH = 128
+MAX_SECONDS = 600  # a forgotten session stops by itself
+SKIP_PREFIX = "/api/admin"  # don't profile the profiler's own endpoints
+_WORK_ITEM_RUN = pool_thread._WorkItem.run.__code__
+
+def route_label(scope) -> str:
+    """'POST /api/embed/{pdf_id}': the request path with its path parameters put back as names."""
+    label = scope.get("profiler.route")
+    if label is None:
+        if "endpoint" not in scope:
+            return f"{scope['method']} (unrouted)"  # not routed yet, or a 404
+        values = {str(v): k for k, v in scope.get("path_params", {}).items()}
+        path = "/".join(f"{{{values[seg]}}}" if seg in values else seg for seg in scope["path"].split("/"))
+        label = scope["profiler.route"] = f"{scope['method']} {path}"
+    return label
+
+def _frame_label(code) -> str:
+    return f"{Path(code.co_filename).name}:{code.co_qualname}"
+
+class _Session:
+    def __init__(self, requests: Optional[int], seconds: float, interval: float, memory: bool):
+        self.inflight: Dict[int, Dict] = {}  # id(scope) -> scope of requests being served
+        self.max_requests = requests
+        self.seconds = seconds
+        self.interval = interval
+        self.memory = memory
+        self.started = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.stacks: Dict[str, Counter] = defaultdict(Counter)  # route -> collapsed stack -> samples
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.ticks = 0
+        self.reason: Optional[str] = None
+        self.stop = threading.Event()
+        self.baseline = None
+        self.owns_tracemalloc = False
+
+class Profiler:
+    def __init__(self):
+        self.active = False  # the only thing the middleware reads when idle
+        self.session: Optional[_Session] = None
+        self.report: Optional[Dict] = None
+        self.collapsed: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None,
+              interval_ms: float = 10, memory: bool = False, memory_frames: int = 16) -> Dict:
+        """Profile the next `requests` requests or `seconds` seconds, whichever ends first."""
+        with self._lock:
+            if self.active:
+                raise RuntimeError("A profiling session is already running.")
+            # a request count alone still ends after MAX_SECONDS; neither given means 30 s
+            seconds = min(seconds or (MAX_SECONDS if requests else 30), MAX_SECONDS)
+            session = _Session(requests, seconds, interval_ms / 1000, memory)
+            if memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(memory_frames)
+                    session.owns_tracemalloc = True
+                tracemalloc.reset_peak()
+                session.baseline = tracemalloc.take_snapshot()
+            self.session = session
+            self.active = True
+            self._thread = threading.Thread(target=self._run, args=(session,), name="profiler", daemon=True)
+            self._thread.start()
+        until = f"{requests} requests or {seconds:g}s" if requests else f"{seconds:g}s"
+        print(f"🔬 Profiling for {until}, sampling every {interval_ms:g} ms{' with tracemalloc' if memory else ''}")
+        return self.status()
+
+    def stop(self, reason: str = "stopped") -> Optional[Dict]:
+        """End the running session (if any) and return the latest report."""
+        session, thread = self.session, self._thread
+        if session is not None and self.active:
+            session.reason = session.reason or reason
+            session.stop.set()
+            thread.join()
+        return self.report
+
+    # ——— Request side (event loop) ———
+
+    def request_started(self, scope):
+        session = self.session
+        if session is not None:
+            with self._lock:
+                session.inflight[id(scope)] = scope
+
+    def request_finished(self, scope, seconds: float):
+        session = self.session
+        if session is None:
+            return
+        with self._lock:
+            session.inflight.pop(id(scope), None)
+            if session.stop.is_set():
+                return
+            session.latencies[route_label(scope)].append(seconds)
+            done = sum(len(v) for v in session.latencies.values())
+        if session.max_requests and done >= session.max_requests:
+            session.reason = "requests"
+            session.stop.set()  # the sampler thread writes the report
+
+    # ——— Sampler thread ———
+
+    def _route_of(self, endpoints: Dict, frame) -> tuple:
+        """(route or None, collapsed stack from the route's entry frame down to the leaf)."""
+        frames = []
+        while frame is not None and len(frames) < MAX_DEPTH:
+            code = frame.f_code
+            if code in endpoints:
+                frames.append(code)
+                return endpoints[code], frames
+            if code is _WORK_ITEM_RUN:
+                # asyncio.to_thread runs functools.partial(context.run, func) in the pool
+                fn = getattr(frame.f_locals.get("self"), "fn", None)
+                context = getattr(getattr(fn, "func", None), "__self__", None) \
+                    if isinstance(fn, functools.partial) else None
+                scope = context.get(REQUEST) if isinstance(context, contextvars.Context) else None
+                return (route_label(scope) if scope is not None else None), frames
+            frames.append(code)
+            frame = frame.f_back
+        return None, frames
+
+    def _run(self, session: _Session):
+        me = threading.get_ident()
+        while not session.stop.wait(session.interval):
+            if time.monotonic() > session.deadline:
+                session.reason = "time"
+                break
+            session.ticks += 1
+            with self._lock:
+                scopes = list(session.inflight.values())
+            endpoints = {s["endpoint"].__code__: route_label(s) for s in scopes
+                         if hasattr(s.get("endpoint"), "__code__")}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                label, frames = self._route_of(endpoints, frame)
+                if label is None:
+                    continue
+                stack = ";".join(_frame_label(c) for c in reversed(frames))
+                session.stacks[label][stack] += 1
+        self._finish(session)
+
+    def _finish(self, session: _Session):
+        elapsed = time.time() - session.started
+        interval_ms = session.interval * 1000
+        routes = {}
+        with self._lock:
+            labels = set(session.stacks) | set(session.latencies)
+            for label in sorted(labels):
+                stacks, latencies = session.stacks.get(label, Counter()), sorted(session.latencies.get(label, []))
+                leaves = Counter()
+                for stack, n in stacks.items():
+                    leaves[stack.rsplit(";", 1)[-1]] += n
+                samples = sum(stacks.values())
+                routes[label] = {
+                    "requests": len(latencies),
+                    "avg_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                    "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                    "samples": samples,
+                    "sampled_ms": round(samples * interval_ms, 1),
+                    "top_frames": [{"frame": f, "samples": n, "share": round(n / samples, 3)}
+                                   for f, n in leaves.most_common(15)],
+                }
+        report = {
+            "reason": session.reason or "stopped",
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(session.started)),
+            "seconds": round(elapsed, 2),
+            "interval_ms": interval_ms,
+            "ticks": session.ticks,
+            "routes": routes,
+        }
+        if session.memory:
+            report["memory"] = self._memory_report(session)
+        with self._lock:
+            self.report = report
+            self.collapsed = dict(session.stacks)
+            self.active = False
+        print(f"🔬 Profiling finished ({report['reason']}): {len(routes)} routes, "
+              f"{sum(r['samples'] for r in routes.values())} samples in {report['seconds']}s")
+
+    def _memory_report(self, session: _Session, top: int = 25) -> Dict:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        if session.owns_tracemalloc:
+            tracemalloc.stop()
+        growth = snapshot.compare_to(session.baseline, "lineno")
+        return {
+            "traced_mb": round(current / 2**20, 2),
+            "peak_mb": round(peak / 2**20, 2),
+            "top_growth": [{"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                            "size_kb": round(s.size_diff / 1024, 1), "count": s.count_diff}
+                           for s in growth[:top] if s.size_diff > 0],
+            "top_sites": [{"site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                           "size_kb": round(s.size / 1024, 1), "count": s.count}
+                          for s in snapshot.statistics("lineno")[:top]],
+        }
+
+    # ——— Results ———
+
+    def status(self) -> Dict:
+        session = self.session
+        if self.active and session is not None:
+            with self._lock:
+                requests = sum(len(v) for v in session.latencies.values())
+            return {"running": True, "elapsed_s": round(time.time() - session.started, 1),
+                    "requests": requests, "max_requests": session.max_requests, "seconds": session.seconds,
+                    "ticks": session.ticks, "memory": session.memory}
+        return {"running": False, "report": self.report}
+
+    def collapsed_stacks(self, route: Optional[str] = None) -> str:
+        """Brendan Gregg's folded format (flamegraph.pl, speedscope): 'route;frame;...;leaf samples'."""
+        with self._lock:
+            lines = [f"{label};{stack} {n}"
+                     for label, stacks in sorted(self.collapsed.items()) if route is None or route in label
+                     for stack, n in stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+profiler = Profiler()
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: a no-op unless a profiling session is running."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.active or scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIX):
+            return await self.app(scope, receive, send)
+        token = REQUEST.set(scope)  # routing fills in scope["endpoint"] before the endpoint runs
+        profiler.request_started(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            REQUEST.reset(token)
+            profiler.request_finished(scope, time.perf_counter() - start)
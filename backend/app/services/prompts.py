@@ -0,0 +1,100 @@
+import hashlib
+from typing import Dict, List, Tuple
+
+from app.services import catalog
+
+# Prompts are split into a system message that is byte-identical for every
+# question on the same textbook and role (instructions, title, TOC) and a user
+# message with the retrieved context and the question. Inference servers that
+# reuse the KV cache for a shared prefix then only prefill the user message.
+
+# ——— Role‐specific prompt templates ———
+ROLE_PROMPTS = {
+    "strict": (
+        "Answer ONLY using the textbook context provided. "
+        "If the answer is not in the textbook context, say 'This information is not available in the provided textbook content.'"
+    ),
+    "default": (
+        "Answer the question using the textbook context when available. "
+        "If the textbook context doesn't contain the answer, you may provide general knowledge to help the user, "
+        "but clearly indicate when you're drawing from general knowledge vs. the textbook."
+    )
+}
+
+# ——— Global system instruction ———
+SYSTEM_INSTRUCTION = (
+    "You are a highly knowledgeable AI assistant trained on academic textbooks.\n"
+    "If textbook context is provided, answer strictly from it. "
+    "Otherwise you may answer any general question helpfully.\n"
+)
+
+ANSWER_INSTRUCTIONS = {
+    "strict": "Answer based ONLY on the textbook content above:",
+    "default": (
+        "Answer using the textbook content above. If the textbook doesn't contain the answer, "
+        "you may provide general knowledge but clearly indicate the source:"
+    ),
+}
+
+LIST_INSTRUCTION = "Format your answer as a bulleted list.\n"
+
+SOURCES_INSTRUCTION = (
+    "Content comes from several textbooks; each excerpt starts with its [book, page]. "
+    "Name the book and page for what you use."
+)
+
+def toc_note(meta: dict) -> str:
+    """Title and chapter list from a textbook's catalog entry."""
+    note = ""
+    if meta.get("title"):
+        note += f"Title: {meta['title']}\n"
+    chapters = meta.get("chapters") or []
+    if chapters:
+        note += "Chapters:\n"
+        for ch in chapters:
+            note += f"- {ch['title']} (page {ch['page']})\n"
+        note += "\n"
+    return note
+
+def book_system_message(pdf_id: str, role_key: str) -> str:
+    """The stable per-textbook prefix: same bytes for every question on this book and role."""
+    return system_message_for(catalog.get_textbook(pdf_id) or {}, role_key)
+
+def books_system_message(pdf_ids: List[str], role_key: str) -> str:
+    """Prefix for one or several textbooks; the same set in any order gives the same bytes."""
+    if len(pdf_ids) == 1:
+        return book_system_message(pdf_ids[0], role_key)
+    parts = [SYSTEM_INSTRUCTION, ROLE_PROMPTS[role_key], SOURCES_INSTRUCTION]
+    parts += [toc_note({"title": p, **(catalog.get_textbook(p) or {})}) for p in sorted(pdf_ids)]
+    return "\n".join(filter(None, parts))
+
+def system_message_for(meta: dict, role_key: str) -> str:
+    parts = [SYSTEM_INSTRUCTION, ROLE_PROMPTS[role_key], toc_note(meta)]
+    return "\n".join(filter(None, parts))
+
+def examples_note(examples: List[Dict]) -> str:
+    """Few-shot tutor examples picked for this question."""
+    if not examples:
+        return ""
+    shots = "\n\n".join(f"Q: {e['question']}\nA: {e['answer']}" for e in examples)
+    return f"Examples of good tutor answers:\n{shots}\n"
+
+def rag_user_message(context: str, question: str, role_key: str, list_instr: str = "",
+                     examples: str = "") -> str:
+    parts = [
+        examples,
+        "Textbook content:",
+        context,
+        f"Question: {question}",
+        list_instr,
+        ANSWER_INSTRUCTIONS[role_key],
+    ]
+    return "\n".join(filter(None, parts))
+
+def general_messages(question: str, list_instr: str = "", note: str = "") -> Tuple[str, str]:
+    """(system, user) for answering without textbook context."""
+    return SYSTEM_INSTRUCTION, f"{list_instr}{note}User: {question}\nAI:"
+
+def cache_key(system_message: str) -> str:
+    """Short id of a prompt prefix, sent as a prompt-cache hint."""
+    return hashlib.sha1(system_message.encode("utf-8")).hexdigest()[:16]
@@ -1,66 +1,76 @@
-from app.services import vector_store, lmstudio, embedding
-from app.models.chat_model import ChatQuery, ChatResponse
-from pathlib import Path
-import json
-
-# Few-shot examples removed - no longer needed
-
-# ——— Load role‐specific prompt templates ———
-ROLE_PROMPTS = {
-    "strict": (
-        "Answer ONLY using the textbook context provided. "
-        "If the answer is not in the textbook context, say 'This information is not available in the provided textbook content.'"
-    ),
-    "default": (
-        "Answer the question using the textbook context when available. "
-        "If the textbook context doesn't contain the answer, you may provide general knowledge to help the user, "
-        "but clearly indicate when you're drawing from general knowledge vs. the textbook."
-    )
-}
+import asyncio
+
+from typing import List
 
-# ——— Global system instruction ———
-SYSTEM_INSTRUCTION = (
-    "You are a highly knowledgeable AI assistant trained on academic textbooks.\n"
-    "If textbook context is provided, answer strictly from it. "
-    "Otherwise you may answer any general question helpfully.\n"
+from app.services import vector_store, lmstudio, embedding, summaries, fewshot, catalog
+from app.services.prompts import (
+    LIST_INSTRUCTION,
+    books_system_message, rag_user_message, general_messages, cache_key, examples_note,
 )
+from app.models.chat_model import ChatQuery, ChatResponse
+from app.services.llm_scheduler import QueueFull
+from app.utils.single_flight import AsyncSingleFlight
 
-def get_rag_response(query: ChatQuery) -> ChatResponse:
-    # 1) Determine response mode based on role
-    role_key = query.role.lower().strip()
+# Few-shot examples: only the closest few, within a token budget (see fewshot.py)
+
+# Chunks put in the prompt, across all searched textbooks
+TOP_K = 8
+
+# Identical questions asked at the same time share one retrieval + generation
+inflight = AsyncSingleFlight()
+
+# Conversation-memory writes finish after the response is sent
+_background = set()
+
+def _role_key(role: str) -> str:
+    role_key = role.lower().strip()
     if role_key not in ["strict", "default"]:
         role_key = "default"  # fallback to default if invalid role
+    return role_key
+
+def books_of(query: ChatQuery) -> List[str]:
+    """Textbooks to search: pdf_ids if given, else pdf_id; without repeats or blanks."""
+    ids = query.pdf_ids if query.pdf_ids else [query.pdf_id]
+    return list(dict.fromkeys(p for p in ids if p))
+
+def _title(pdf_id: str) -> str:
+    return (catalog.get_textbook(pdf_id) or {}).get("title") or pdf_id
+
+async def get_rag_response(query: ChatQuery) -> ChatResponse:
+    key = (tuple(books_of(query)), _role_key(query.role), query.session_id, query.model, query.query)
+    return await inflight.do(key, lambda: _answer(query))
+
+async def _answer(query: ChatQuery) -> ChatResponse:
+    # 1) Determine response mode based on role
+    role_key = _role_key(query.role)
 
     # 2) Detect list‐style queries
     q_lower = query.query.lower()
     if any(kw in q_lower for kw in ("list", "bullet", "enumerate", "what are the")):
-        list_instr = "Format your answer as a bulleted list.\n"
+        list_instr = LIST_INSTRUCTION
     else:
         list_instr = ""
 
     # 3) If no PDF, use general knowledge (only for default mode)
-    if not query.pdf_id:
+    books = books_of(query)
+    if not books:
         if role_key == "strict":
             return ChatResponse(
                 answer="No textbook is loaded. Please upload a textbook to get answers from it.",
                 citations=[]
             )
         else:  # default mode
-            prompt = (
-                f"{SYSTEM_INSTRUCTION}"
-                f"{list_instr}"
-                f"User: {query.query}\n"
-                "AI:"
-            )
-            ans = lmstudio.ask_local_llm(prompt)
-            return ChatResponse(answer=ans.strip(), citations=[])
+            return await _general_answer(query, list_instr)
 
     try:
         print("📩 Received:", query.dict())
 
-        # 4) RAG retrieval
-        vec = embedding.get_embeddings([query.query])[0]
-        docs_meta = vector_store.query_vectors(query.pdf_id, vec, k=8)
+        # 4) Independent stages run concurrently: the catalog lookup for the
+        #    per-book prefix, and embedding -> (textbooks, memory and few-shot search)
+        system_message, (vec, docs_meta, memory, examples) = await asyncio.gather(
+            asyncio.to_thread(books_system_message, books, role_key),
+            _retrieve(query, books),
+        )
         docs = docs_meta.get("documents", [[]])[0]
         metas = docs_meta.get("metadatas", [[]])[0]
 
@@ -72,74 +82,40 @@ def get_rag_response(query: ChatQuery) -> ChatResponse:
                     citations=[]
                 )
             else:  # default mode - provide general knowledge
-                prompt = (
-                    f"{SYSTEM_INSTRUCTION}"
-                    f"{list_instr}"
-                    f"The textbook doesn't contain information about this topic, so I'll provide general knowledge:\n\n"
-                    f"User: {query.query}\n"
-                    "AI:"
+                return await _general_answer(
+                    query, list_instr,
+                    "The textbook doesn't contain information about this topic, so I'll provide general knowledge:\n\n"
                 )
-                ans = lmstudio.ask_local_llm(prompt)
-                return ChatResponse(answer=ans.strip(), citations=[])
-
-        # 6) Build the chapter TOC snippet from metadata
-        first_meta = metas[0] if metas else {}
-        toc = first_meta.get("chapters", [])
-        toc_note = ""
-        if first_meta.get("title"):
-            toc_note += f"Title: {first_meta['title']}\n"
-        if toc:
-            toc_note += "Chapters:\n"
-            for ch in toc:
-                toc_note += f"- {ch['title']} (page {ch['page']})\n"
-            toc_note += "\n"
-
-        # 7) Grab the role prompt
-        role_prompt = ROLE_PROMPTS.get(role_key, ROLE_PROMPTS["default"])
-
-        # 8) Build context for prompt
-
-        # 9) Assemble full prompt based on role
+
+        # 6) Stable per-book prefix (instructions, title, TOC) is the system message;
+        #    conversation memory, retrieved context and the question go after it
+        if len(books) > 1:
+            # tag each excerpt with its source so the answer can cite book and page
+            docs = [f"[{_title(m.get('pdf_id'))}, page {m.get('page', '?')}] {d}"
+                    for d, m in zip(docs, metas)]
         context = "\n\n".join(docs)
-        
-        if role_key == "strict":
-            # Strict mode: only textbook content
-            prompt_parts = [
-                SYSTEM_INSTRUCTION,
-                ROLE_PROMPTS["strict"],
-                toc_note,
-                "Textbook content:",
-                context,
-                f"Question: {query.query}",
-                "Answer based ONLY on the textbook content above:"
-            ]
-        else:
-            # Default mode: textbook + general knowledge if needed
-            prompt_parts = [
-                SYSTEM_INSTRUCTION,
-                ROLE_PROMPTS["default"],
-                toc_note,
-                "Textbook content:",
-                context,
-                f"Question: {query.query}",
-                "Answer using the textbook content above. If the textbook doesn't contain the answer, "
-                "you may provide general knowledge but clearly indicate the source:"
-            ]
-        
-        if list_instr:
-            prompt_parts.insert(-1, list_instr)
-        
-        prompt = "\n".join(filter(None, prompt_parts))
+        prompt = memory + rag_user_message(context, query.query, role_key, list_instr,
+                                           examples_note(examples))
 
         print("🧠 Final prompt:", prompt[:200].replace("\n", " "))
-        answer = lmstudio.ask_local_llm(prompt)
-
-        # 10) Collect page citations
-        pages = [m.get("page") for m in metas if m and m.get("page") is not None]
-        citations = [f"page {p}" for p in pages]
+        answer = await lmstudio.ask_local_llm_async(prompt, system_message=system_message,
+                                                    cache_key=cache_key(system_message),
+                                                    **_model_kwargs(query))
+        if query.session_id and not answer.startswith("Error:"):
+            _remember(query.session_id, query.query, answer, vec)
+
+        # 7) Collect page citations
+        cited = [m for m in metas if m and m.get("page") is not None]
+        if len(books) > 1:
+            citations = [f"{_title(m['pdf_id'])}, page {m['page']}" for m in cited]
+        else:
+            citations = [f"page {m['page']}" for m in cited]
 
         return ChatResponse(answer=answer.strip(), citations=citations)
 
+    except QueueFull:
+        # Overloaded: let the route answer 429 rather than retry as a general answer
+        raise
     except Exception as e:
         print("[RAG ERROR]", e)
         # Fallback based on role
@@ -149,10 +125,62 @@ def get_rag_response(query: ChatQuery) -> ChatResponse:
                 citations=[]
             )
         else:  # default mode
-            fallback = (
-                f"{SYSTEM_INSTRUCTION}"
-                f"{list_instr}"
-                f"User: {query.query}\nAI:"
-            )
-            ans = lmstudio.ask_local_llm(fallback)
-            return ChatResponse(answer=ans.strip(), citations=[])
\ No newline at end of file
+            return await _general_answer(query, list_instr)
+
+async def _retrieve(query: ChatQuery, books: List[str]):
+    """Embed the question (CPU-bound, off the event loop), then search the books, memory and examples together."""
+    vec = (await asyncio.to_thread(embedding.get_embeddings, [query.query]))[0]
+    docs_meta, memory, examples = await asyncio.gather(
+        _search_books(books, query.query, vec),
+        _conversation_memory(query.session_id, vec),
+        asyncio.to_thread(fewshot.select_examples, vec),
+    )
+    return vec, docs_meta, memory, examples
+
+async def _search_books(books: List[str], question: str, vec):
+    """Search every book at once and keep the TOP_K nearest chunks overall."""
+    found = await asyncio.gather(*(_search_book(pdf_id, question, vec) for pdf_id in books))
+    if len(books) == 1:
+        return found[0]
+    return vector_store.merge_results(dict(zip(books, found)), TOP_K)
+
+async def _search_book(pdf_id: str, question: str, vec):
+    """Overview questions use the precomputed summary tree when the book has one."""
+    if summaries.is_overview(question):
+        found = await asyncio.to_thread(summaries.find_overview, pdf_id, question, vec)
+        if found:
+            print("🌳 Answering from summary nodes")
+            return found
+    return await asyncio.to_thread(vector_store.query_vectors, pdf_id, vec, TOP_K)
+
+async def _conversation_memory(session_id, vec) -> str:
+    if not session_id:
+        return ""
+    try:
+        return await asyncio.to_thread(vector_store.get_conversation_context, session_id, vec)
+    except Exception as e:
+        print("⚠️ Conversation memory unavailable:", e)
+        return ""
+
+def _remember(session_id: str, question: str, answer: str, question_vec):
+    def save():
+        answer_vec = embedding.get_embeddings([answer])[0]
+        vector_store.save_conversation(session_id, question, answer, question_vec, answer_vec)
+
+    task = asyncio.ensure_future(asyncio.to_thread(save))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+def _model_kwargs(query: ChatQuery) -> dict:
+    """Per-request model choice (routed by the pool) and the session to queue fairly under."""
+    kwargs = {"session": query.session_id}
+    if query.model:
+        kwargs["model"] = query.model
+    return kwargs
+
+async def _general_answer(query: ChatQuery, list_instr: str, note: str = "") -> ChatResponse:
+    system_message, prompt = general_messages(query.query, list_instr, note)
+    ans = await lmstudio.ask_local_llm_async(prompt, system_message=system_message,
+                                             cache_key=cache_key(system_message),
+                                             **_model_kwargs(query))
+    return ChatResponse(answer=ans.strip(), citations=[])
\ No newline at end of file
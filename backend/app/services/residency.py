@@ -0,0 +1,153 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from app.utils.single_flight import SingleFlight
+
+# In-process search indexes for the textbooks people actually use. Access
+# counts decay over time (half-life in days) and are saved next to the store,
+# so the hottest books can be preloaded after a restart. Loaded indexes sit in
+# an LRU that never holds more than the memory budget; a budget of 0 keeps none.
+
+SAVE_EVERY_S = 30
+
+class ResidencyManager:
+    def __init__(self, budget_bytes: int, loader: Callable[[str], Optional[object]],
+                 stats_path: Path, half_life_days: float = 7.0):
+        self.budget = budget_bytes
+        self.loader = loader  # pdf_id -> index with .nbytes() and .ids, or None
+        self.stats_path = stats_path
+        self.decay = math.log(2) / (half_life_days * 86400)
+        self.resident: "OrderedDict[str, object]" = OrderedDict()
+        self.used = 0
+        self._generation: Dict[str, int] = {}  # bumped by invalidate, so in-flight loads of old data aren't kept
+        self._too_big: Dict[str, int] = {}  # pdf_id -> bytes, not retried until invalidated
+        self.counters = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "too_big": 0, "load_seconds": 0.0}
+        self._lock = threading.Lock()
+        self._loads = SingleFlight()
+        self._saved_at = time.time()
+        self.access = self._read_access()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    # ——— Access frequency ———
+
+    def _read_access(self) -> Dict[str, Dict[str, float]]:
+        try:
+            return json.loads(self.stats_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _score(self, entry: Dict[str, float], now: float) -> float:
+        return entry["score"] * math.exp(-self.decay * (now - entry["at"]))
+
+    def touch(self, pdf_id: str):
+        """Count one access to a textbook."""
+        now = time.time()
+        with self._lock:
+            entry = self.access.get(pdf_id)
+            score = self._score(entry, now) if entry else 0.0
+            self.access[pdf_id] = {"score": score + 1, "at": now}
+            due = now - self._saved_at > SAVE_EVERY_S
+            if due:
+                self._saved_at = now
+        if due:
+            self.save_access()
+
+    def save_access(self):
+        with self._lock:
+            data = json.dumps(self.access)
+        self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.stats_path.with_name(self.stats_path.name + ".tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.stats_path)
+
+    def hottest(self, n: int) -> List[str]:
+        now = time.time()
+        with self._lock:
+            ranked = sorted(self.access, key=lambda p: self._score(self.access[p], now), reverse=True)
+        return ranked[:n]
+
+    def forget(self, pdf_id: str):
+        """Drop a deleted textbook's index and access history."""
+        self.invalidate(pdf_id)
+        with self._lock:
+            self.access.pop(pdf_id, None)
+
+    # ——— Resident indexes ———
+
+    def get(self, pdf_id: str):
+        """The book's index, loading it (and evicting cold ones) if needed; None if it can't be held."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if pdf_id in self._too_big:
+                return None
+            index = self.resident.get(pdf_id)
+            if index is not None:
+                self.resident.move_to_end(pdf_id)
+                self.counters["hits"] += 1
+                return index
+            self.counters["misses"] += 1
+        return self._loads.do(pdf_id, lambda: self._load(pdf_id))
+
+    def _load(self, pdf_id: str):
+        start = time.perf_counter()
+        with self._lock:
+            generation = self._generation.get(pdf_id, 0)
+        index = self.loader(pdf_id)
+        if index is None:
+            return None
+        size = index.nbytes()
+        with self._lock:
+            self.counters["loads"] += 1
+            self.counters["load_seconds"] += time.perf_counter() - start
+            if size > self.budget:
+                self.counters["too_big"] += 1
+                self._too_big[pdf_id] = size
+                print(f"⚠️ Index of {pdf_id} ({size / 2**20:.0f} MiB) exceeds the residency budget")
+                return None
+            if self._generation.get(pdf_id, 0) != generation:
+                return None  # vectors changed while loading; the caller falls back to Chroma
+            current = self.resident.get(pdf_id)
+            if current is not None:
+                # a load that finished between get()'s miss and ours already counted its size
+                self.resident.move_to_end(pdf_id)
+                return current
+            while self.resident and self.used + size > self.budget:
+                old_id, old = self.resident.popitem(last=False)
+                self.used -= old.nbytes()
+                self.counters["evictions"] += 1
+                print(f"♻️ Evicted index of {old_id} from memory")
+            self.resident[pdf_id] = index
+            self.used += size
+        return index
+
+    def invalidate(self, pdf_id: str):
+        """Forget a book's loaded index after its vectors changed."""
+        with self._lock:
+            self._generation[pdf_id] = self._generation.get(pdf_id, 0) + 1
+            self._too_big.pop(pdf_id, None)
+            index = self.resident.pop(pdf_id, None)
+            if index is not None:
+                self.used -= index.nbytes()
+
+    def stats(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "budget_mb": round(self.budget / 2**20, 1),
+                "used_mb": round(self.used / 2**20, 1),
+                "resident": {p: round(i.nbytes() / 2**20, 2) for p, i in self.resident.items()},
+                "over_budget": {p: round(b / 2**20, 2) for p, b in self._too_big.items()},
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.counters.items()},
+                "hot": {p: round(self._score(e, now), 2)
+                        for p, e in sorted(self.access.items(), key=lambda kv: -self._score(kv[1], now))[:10]},
+            }
@@ -0,0 +1,281 @@
+"""
+Portable textbook snapshots: one file with everything a node needs to serve a book.
+
+A snapshot is a zip holding the book's chunks (ids, documents, metadata),
+their float32 vectors as one raw little-endian matrix, the summary tree if
+there is one, the catalog entry and optionally the PDF. manifest.json records
+the format version, the embedding model id and a SHA-256 per member; import
+checks all of them before writing anything, then bulk-loads the collections
+under temporary names and only swaps them in once everything is loaded, so a
+failed import never costs the copy already being served. No embedding model
+is loaded on either side.
+
+    python -m app.services.snapshots export <pdf_id> --out book.tbsnap
+    python -m app.services.snapshots import book.tbsnap --replace
+"""
+import argparse
+import hashlib
+import io
+import json
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.config import EMBEDDING_MODEL, UPLOAD_DIR, VECTOR_COMPRESSION
+from app.services import catalog, vector_store
+from app.services.vector_store import WRITE_BATCH_SIZE, client
+
+FORMAT = "drax-textbook-snapshot"
+FORMAT_VERSION = 1
+HASH_BLOCK = 1 << 20
+SAFE_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{2,127}")  # becomes a file and collection name
+# imports load into "import-<unix time>-<random>" collections first; maintenance
+# leaves ones younger than STAGING_GRACE_S alone, older ones are from dead imports
+STAGING_PREFIX = "import-"
+STAGING_GRACE_S = 6 * 3600
+# catalog entry fields a snapshot may set, with their types (as routes/uploads.py writes them)
+CATALOG_FIELDS = {"title": str, "author": str, "pages": (int, str), "chapters": list, "original_name": str}
+
+class SnapshotError(ValueError):
+    """The snapshot is unreadable, corrupt or doesn't fit this node."""
+
+class _HashingWriter:
+    """File-like wrapper for a zip member that hashes what goes through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.sha.update(data)
+        self.f.write(data)
+
+def _stored(zf: zipfile.ZipFile, name: str):
+    """Open an uncompressed member for writing (vectors and PDFs don't deflate)."""
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = zipfile.ZIP_STORED
+    return zf.open(info, "w", force_zip64=True)
+
+def _pages(collection, include) -> Iterator[Dict[str, Any]]:
+    total = collection.count()
+    for offset in range(0, total, WRITE_BATCH_SIZE):
+        yield collection.get(include=include, limit=WRITE_BATCH_SIZE, offset=offset)
+
+def _write_collection(zf: zipfile.ZipFile, collection, prefix: str, members: Dict) -> Tuple[int, int]:
+    """
+    Stream a collection into <prefix>.jsonl + <prefix>.f32; returns (count, dim).
+    A zip takes one member at a time, so vectors are spooled to a temp file
+    while the rows are written, then copied in.
+    """
+    count, dim = 0, 0
+    with tempfile.TemporaryFile() as spool:
+        vecs = _HashingWriter(spool)
+        with zf.open(f"{prefix}.jsonl", "w") as rows_f:
+            rows = _HashingWriter(rows_f)
+            for page in _pages(collection, ["embeddings", "documents", "metadatas"]):
+                vectors = np.ascontiguousarray(page["embeddings"], dtype="<f4")
+                dim = vectors.shape[1]
+                vecs.write(vectors.tobytes())
+                rows.write("".join(json.dumps({"id": i, "document": d, "metadata": m}, ensure_ascii=False) + "\n"
+                                   for i, d, m in zip(page["ids"], page["documents"], page["metadatas"]))
+                           .encode("utf-8"))
+                count += len(page["ids"])
+        spool.seek(0)
+        with _stored(zf, f"{prefix}.f32") as vec_f:
+            shutil.copyfileobj(spool, vec_f, HASH_BLOCK)
+    members[f"{prefix}.jsonl"] = rows.sha.hexdigest()
+    members[f"{prefix}.f32"] = vecs.sha.hexdigest()
+    return count, dim
+
+def export_snapshot(pdf_id: str, out_path: Path, include_pdf: bool = True) -> Dict[str, Any]:
+    """Write one embedded textbook to out_path; returns the manifest."""
+    if pdf_id not in vector_store.collection_names():
+        raise SnapshotError(f"Textbook {pdf_id} has not been embedded.")
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    members: Dict[str, str] = {}
+    start = time.time()
+
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        chunks, dim = _write_collection(zf, client.get_collection(pdf_id), "chunks", members)
+        summaries = 0
+        tree = vector_store.summary_collection(pdf_id, create=False)
+        if tree is not None and tree.count():
+            summaries, _ = _write_collection(zf, tree, "summaries", members)
+        pdf_path = UPLOAD_DIR / f"{pdf_id}.pdf"
+        if include_pdf and pdf_path.exists():
+            with open(pdf_path, "rb") as src, _stored(zf, "book.pdf") as dst:
+                out = _HashingWriter(dst)
+                while block := src.read(HASH_BLOCK):
+                    out.write(block)
+            members["book.pdf"] = out.sha.hexdigest()
+
+        manifest = {
+            "format": FORMAT, "version": FORMAT_VERSION, "pdf_id": pdf_id,
+            "embedding_model": EMBEDDING_MODEL, "dim": dim,
+            "chunks": chunks, "summaries": summaries,
+            "catalog": catalog.get_textbook(pdf_id) or {},
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "sha256": members,
+        }
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+    tmp_path.replace(out_path)
+
+    print(f"📦 Exported {pdf_id}: {chunks} chunks, {summaries} summary nodes, "
+          f"{out_path.stat().st_size / 2**20:.1f} MiB in {time.time() - start:.1f}s -> {out_path}")
+    return manifest
+
+def read_manifest(zf: zipfile.ZipFile) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(zf.read("manifest.json"))
+    except KeyError:
+        raise SnapshotError("Not a textbook snapshot: manifest.json is missing.")
+    if manifest.get("format") != FORMAT:
+        raise SnapshotError("Not a textbook snapshot.")
+    if manifest.get("version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {manifest.get('version')} "
+                            f"(this node reads version {FORMAT_VERSION}).")
+    if not SAFE_ID.fullmatch(str(manifest.get("pdf_id", ""))):
+        raise SnapshotError(f"Invalid textbook id in snapshot: {manifest.get('pdf_id')!r}")
+    _check_catalog(manifest.get("catalog"))
+    return manifest
+
+def staging_started(name: str) -> Optional[float]:
+    """Unix time an import staging collection was created, or None if name isn't one."""
+    if not name.startswith(STAGING_PREFIX):
+        return None
+    stamp = name[len(STAGING_PREFIX):].split("-", 1)[0]
+    return float(stamp) if stamp.isdigit() else 0.0  # unparseable: treat as long dead
+
+def _check_catalog(entry):
+    if not isinstance(entry, dict):
+        raise SnapshotError("Snapshot catalog entry is not an object.")
+    for key, value in entry.items():
+        if key not in CATALOG_FIELDS:
+            raise SnapshotError(f"Unexpected catalog field in snapshot: {key!r}")
+        if not isinstance(value, CATALOG_FIELDS[key]) or isinstance(value, bool):
+            raise SnapshotError(f"Catalog field {key!r} in snapshot has the wrong type.")
+    if not all(isinstance(c, dict) and isinstance(c.get("title"), str) for c in entry.get("chapters", [])):
+        raise SnapshotError("Snapshot chapters must be objects with a title.")
+
+def verify(zf: zipfile.ZipFile, manifest: Dict[str, Any]):
+    """Check every member against its recorded SHA-256 and the vector sizes against the counts."""
+    for name, digest in manifest["sha256"].items():
+        sha = hashlib.sha256()
+        try:
+            with zf.open(name) as f:
+                while block := f.read(HASH_BLOCK):
+                    sha.update(block)
+        except (KeyError, zipfile.BadZipFile) as e:
+            raise SnapshotError(f"Snapshot member {name} is unreadable: {e}")
+        if sha.hexdigest() != digest:
+            raise SnapshotError(f"Checksum mismatch in {name}.")
+    for prefix, count in (("chunks", manifest["chunks"]), ("summaries", manifest["summaries"])):
+        if count and zf.getinfo(f"{prefix}.f32").file_size != count * manifest["dim"] * 4:
+            raise SnapshotError(f"{prefix}.f32 does not hold {count} vectors of {manifest['dim']} dims.")
+
+def _load_collection(zf: zipfile.ZipFile, prefix: str, collection, dim: int) -> int:
+    """Bulk-add <prefix>.jsonl + <prefix>.f32 into collection, a WRITE_BATCH_SIZE page at a time."""
+    loaded = 0
+    with zf.open(f"{prefix}.jsonl") as rows_f, zf.open(f"{prefix}.f32") as vec_f:
+        lines = io.TextIOWrapper(rows_f, encoding="utf-8")
+        while True:
+            rows = [json.loads(line) for _, line in zip(range(WRITE_BATCH_SIZE), lines)]
+            if not rows:
+                break
+            vectors = np.frombuffer(vec_f.read(len(rows) * dim * 4), dtype="<f4").reshape(len(rows), dim)
+            collection.add(ids=[r["id"] for r in rows], documents=[r["document"] for r in rows],
+                           metadatas=[r["metadata"] for r in rows], embeddings=list(vectors))
+            loaded += len(rows)
+    return loaded
+
+def import_snapshot(path: Path, replace: bool = False, allow_model_mismatch: bool = False) -> Dict[str, Any]:
+    """
+    Load a snapshot into this node's vector store and catalog. An existing
+    copy of the book is only overwritten with replace=True.
+    """
+    start = time.time()
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise SnapshotError(f"Not a textbook snapshot: {e}")
+    with zf:
+        manifest = read_manifest(zf)
+        pdf_id = manifest["pdf_id"]
+        if manifest["embedding_model"] != EMBEDDING_MODEL and not allow_model_mismatch:
+            raise SnapshotError(f"Snapshot was embedded with {manifest['embedding_model']}, "
+                                f"this node queries with {EMBEDDING_MODEL}.")
+        verify(zf, manifest)
+
+        names = vector_store.collection_names()
+        if pdf_id in names and not replace:
+            raise FileExistsError(f"Textbook {pdf_id} is already loaded.")
+
+        # load under throwaway names (maintenance removes them if the process dies),
+        # then replace the served copy in one short step
+        staging = f"{STAGING_PREFIX}{int(time.time())}-{uuid.uuid4().hex[:12]}"
+        loaded = {pdf_id: staging}
+        if manifest["summaries"]:
+            loaded[f"{pdf_id}_summaries"] = f"{staging}_summaries"
+        try:
+            chunks = _load_collection(zf, "chunks", client.get_or_create_collection(staging), manifest["dim"])
+            summaries = 0
+            if manifest["summaries"]:
+                summaries = _load_collection(zf, "summaries", client.get_or_create_collection(f"{staging}_summaries"),
+                                             manifest["dim"])
+        except Exception:
+            for temp in loaded.values():
+                if vector_store.existing_collection(temp) is not None:
+                    client.delete_collection(temp)
+            raise
+        vector_store.delete_textbook_vectors(pdf_id)
+        for name, temp in loaded.items():
+            client.get_collection(temp).modify(name=name)
+
+        if "book.pdf" in manifest["sha256"]:
+            UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+            pdf_path = UPLOAD_DIR / f"{pdf_id}.pdf"
+            tmp_path = pdf_path.with_suffix(".pdf.tmp")
+            with zf.open("book.pdf") as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, HASH_BLOCK)
+            tmp_path.replace(pdf_path)
+        catalog.update_textbook(pdf_id, **manifest["catalog"])
+
+    if VECTOR_COMPRESSION != "none":
+        vector_store.build_codes(pdf_id)
+    summary = {"pdf_id": pdf_id, "chunks": chunks, "summaries": summaries,
+               "seconds": round(time.time() - start, 2)}
+    print(f"📥 Imported snapshot {Path(path).name}: {summary}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="write an embedded textbook to a snapshot file")
+    exp.add_argument("pdf_id")
+    exp.add_argument("--out", type=Path, help="default: <pdf_id>.tbsnap")
+    exp.add_argument("--no-pdf", action="store_true", help="leave the PDF itself out")
+    imp = sub.add_parser("import", help="load a snapshot file into this node")
+    imp.add_argument("path", type=Path)
+    imp.add_argument("--replace", action="store_true", help="overwrite the book if it is already loaded")
+    imp.add_argument("--allow-model-mismatch", action="store_true",
+                     help="load even if the snapshot's embedding model differs from EMBEDDING_MODEL")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            export_snapshot(args.pdf_id, args.out or Path(f"{args.pdf_id}.tbsnap"), include_pdf=not args.no_pdf)
+        else:
+            import_snapshot(args.path, replace=args.replace, allow_model_mismatch=args.allow_model_mismatch)
+    except (SnapshotError, FileExistsError) as e:
+        parser.exit(1, f"❌ {e}\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.config import SUMMARY_PIECE_TOKENS, SUMMARY_WORKERS
+from app.services import catalog, embedding, lmstudio, pdf_utils, vector_store
+from app.services.chunker import chunk_text
+
+# Summary tree: chunk -> section -> chapter -> book. Every node is stored in
+# the book's "<pdf_id>_summaries" collection with its own embedding, so an
+# overview question can be answered from one small precomputed node.
+
+LEVEL_WORDS = {"chunk": 120, "section": 200, "chapter": 300, "book": 400}
+FAN_IN = 8  # child summaries combined per LLM call
+PAGES_PER_PART = 20  # split books without chapter headings into parts this long
+PROMPT_VERSION = "1"  # bump to invalidate stored summaries
+
+OVERVIEW_QUERY = re.compile(
+    r"\b(summar(?:y|ies|ise|ize)|overview|outline|recap|main (?:ideas|topics|points)|key (?:ideas|points|takeaways)"
+    r"|what (?:does|is) (?:this|the) (?:book|textbook|chapter)\b.*\b(?:cover|about))", re.I)
+CHAPTER_REF = re.compile(r"\bchapter\s+(\d+)\b", re.I)
+BOOK_REF = re.compile(r"\b(book|textbook|whole|entire)\b", re.I)
+CHAPTER_NUMBER = re.compile(r"^Chapter\s+(\d+)", re.I)
+
+# pdf_id -> status of the last build started in this process
+jobs: Dict[str, Dict] = {}
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(f"{PROMPT_VERSION}\n{text}".encode("utf-8")).hexdigest()
+
+def build_outline(pages: List[str], headings: List[Dict]) -> List[Dict]:
+    """
+    Chapters with their sections as page ranges, from the TOC found by
+    pdf_utils. Pages between a chapter heading and its first section become
+    an untitled lead-in section. Text before the first chapter is skipped.
+    """
+    last = len(pages)
+    starts = [h for h in headings if pdf_utils.CHAPTER_LINE.match(h["title"])]
+    if not starts:
+        starts = [{"title": f"Pages {p}-{min(p + PAGES_PER_PART - 1, last)}", "page": p}
+                  for p in range(1, last + 1, PAGES_PER_PART)]
+
+    outline = []
+    for n, ch in enumerate(starts):
+        end = starts[n + 1]["page"] - 1 if n + 1 < len(starts) else last
+        end = max(end, ch["page"])
+        m = CHAPTER_NUMBER.match(ch["title"])
+        sections = [h for h in headings
+                    if pdf_utils.SECTION_LINE.match(h["title"]) and ch["page"] <= h["page"] <= end]
+
+        bounds = []
+        if not sections or sections[0]["page"] > ch["page"]:
+            lead_end = sections[0]["page"] - 1 if sections else end
+            bounds.append((ch["title"], ch["page"], lead_end))
+        for k, sec in enumerate(sections):
+            sec_end = sections[k + 1]["page"] - 1 if k + 1 < len(sections) else end
+            bounds.append((sec["title"], sec["page"], max(sec_end, sec["page"])))
+
+        parts = []
+        for title, a, b in bounds:
+            text = " ".join(p for p in pages[a - 1:b] if p)
+            if text:
+                parts.append({"title": title, "page_start": a, "page_end": b, "text": text})
+        if parts:
+            outline.append({"title": ch["title"], "chapter": int(m.group(1)) if m else n + 1,
+                            "page_start": ch["page"], "page_end": end, "sections": parts})
+    return outline
+
+class _Builder:
+    def __init__(self, pdf_id: str, existing: Dict[str, Dict]):
+        self.pdf_id = pdf_id
+        self.existing = existing
+        self.stats = {"nodes": 0, "llm_calls": 0, "reused": 0}
+        self.kept = set()
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _llm(self, text: str, level: str) -> str:
+        self._count("llm_calls")
+        answer = lmstudio.ask_for_summary(
+            text, max_length=LEVEL_WORDS[level], priority="batch", temperature=0.3,
+            system_message="You write faithful, dense summaries of textbook material.")
+        if answer.startswith("Error:"):
+            raise RuntimeError(f"Summary of {level} failed: {answer}")
+        return answer.strip()
+
+    def _reduce(self, texts: List[str], level: str) -> str:
+        """Summarize many child summaries, a FAN_IN-sized group at a time."""
+        while len(texts) > FAN_IN:
+            texts = [self._llm("\n\n".join(texts[i:i + FAN_IN]), level)
+                     for i in range(0, len(texts), FAN_IN)]
+        return self._llm("\n\n".join(texts), level)
+
+    def summarize(self, node: Dict) -> Dict:
+        """Fill node["summary"], reusing the stored one when its input is unchanged."""
+        node["hash"] = _hash(node["input"] if isinstance(node["input"], str) else "\n\n".join(node["input"]))
+        self._count("nodes")
+        self.kept.add(node["id"])
+        old = self.existing.get(node["id"])
+        if old and old["metadata"].get("hash") == node["hash"]:
+            self._count("reused")
+            node["summary"], node["fresh"] = old["document"], False
+            return node
+        if isinstance(node["input"], str):
+            node["summary"] = self._llm(node["input"], node["level"])
+        else:
+            node["summary"] = self._reduce(node["input"], node["level"])
+        node["fresh"] = True
+        return node
+
+    def run_level(self, nodes: List[Dict]):
+        with ThreadPoolExecutor(max_workers=max(1, SUMMARY_WORKERS)) as pool:
+            list(pool.map(self.summarize, nodes))
+        fresh = [n for n in nodes if n["fresh"]]
+        if fresh:
+            vectors = embedding.encode([n["summary"] for n in fresh])
+            vector_store.upsert_summary_nodes(
+                self.pdf_id, [n["id"] for n in fresh], [n["summary"] for n in fresh], vectors,
+                [{"level": n["level"], "title": n["title"], "chapter": n["chapter"],
+                  "page": n["page_start"], "page_end": n["page_end"],
+                  "parent": n["parent"], "hash": n["hash"]} for n in fresh])
+
+def build_summary_tree(pdf_id: str, pdf_path: Path) -> Dict[str, int]:
+    """(Re)build the summary tree for one embedded PDF. Unchanged nodes cost no LLM call."""
+    pages, headings = pdf_utils.extract_pages(pdf_path)
+    outline = build_outline(pages, headings)
+    builder = _Builder(pdf_id, vector_store.get_summary_nodes(pdf_id))
+
+    chunk_nodes, section_nodes, chapter_nodes = [], [], []
+    for n, ch in enumerate(outline):
+        # ids go by position: detected chapter numbers can repeat
+        ch_id = f"chapter:{n}"
+        for s, sec in enumerate(ch["sections"]):
+            sec_id = f"section:{n}.{s}"
+            pieces = chunk_text(sec["text"], max_tokens=SUMMARY_PIECE_TOKENS, overlap=0)
+            section = {"id": sec_id, "level": "section", "title": sec["title"], "chapter": ch["chapter"],
+                       "page_start": sec["page_start"], "page_end": sec["page_end"], "parent": ch_id}
+            if len(pieces) == 1:
+                # Short section: summarize its text directly, no chunk level
+                section["input"] = pieces[0]
+            else:
+                section["children"] = [
+                    {"id": f"chunk:{n}.{s}.{p}", "level": "chunk",
+                     "title": f"{sec['title']} (part {p + 1})", "chapter": ch["chapter"],
+                     "page_start": sec["page_start"], "page_end": sec["page_end"],
+                     "parent": sec_id, "input": piece}
+                    for p, piece in enumerate(pieces)]
+                chunk_nodes.extend(section["children"])
+            section_nodes.append(section)
+        chapter_nodes.append({"id": ch_id, "level": "chapter", "title": ch["title"], "chapter": ch["chapter"],
+                              "page_start": ch["page_start"], "page_end": ch["page_end"], "parent": "book",
+                              "children": section_nodes[len(section_nodes) - len(ch["sections"]):]})
+
+    title = (catalog.get_textbook(pdf_id) or {}).get("title") or pdf_id
+    book = {"id": "book", "level": "book", "title": title, "chapter": 0,
+            "page_start": 1, "page_end": len(pages), "parent": "", "children": chapter_nodes}
+
+    start = time.time()
+    builder.run_level(chunk_nodes)
+    for nodes in (section_nodes, chapter_nodes, [book]):
+        for node in nodes:
+            if "children" in node:
+                node["input"] = [f"{c['title']}: {c['summary']}" for c in node["children"]]
+        builder.run_level(nodes)
+
+    stale = [i for i in builder.existing if i not in builder.kept]
+    if stale:
+        vector_store.delete_summary_nodes(pdf_id, stale)
+    summary = {**builder.stats, "removed": len(stale), "seconds": round(time.time() - start, 1)}
+    print(f"🌳 Summary tree for {pdf_id}: {summary}")
+    return summary
+
+def run_job(pdf_id: str, pdf_path: Path):
+    """Background entry point; records progress in jobs[pdf_id]."""
+    jobs[pdf_id] = {"status": "running", "started": time.time()}
+    try:
+        jobs[pdf_id] = {"status": "done", **build_summary_tree(pdf_id, pdf_path)}
+    except Exception as e:
+        print(f"❌ Summary tree for {pdf_id} failed: {e}")
+        jobs[pdf_id] = {"status": "failed", "error": str(e)}
+
+def is_overview(question: str) -> bool:
+    return bool(OVERVIEW_QUERY.search(question))
+
+def find_overview(pdf_id: str, question: str, query_vec) -> Optional[Dict]:
+    """
+    Summary nodes for an overview question, shaped like a query_vectors
+    result; None if the book has no summary tree (or nothing fits).
+    """
+    try:
+        m = CHAPTER_REF.search(question)
+        node = vector_store.chapter_summary(pdf_id, int(m.group(1))) if m else None
+        if node:
+            docs, metas = [node["document"]], [node["metadata"]]
+        else:
+            levels = ["book"] if BOOK_REF.search(question) else ["book", "chapter", "section"]
+            found = vector_store.query_summaries(pdf_id, query_vec, k=1 if levels == ["book"] else 2,
+                                                 levels=levels)
+            docs, metas = found["documents"][0], found["metadatas"][0]
+    except Exception as e:
+        print(f"⚠️ Summary lookup failed for {pdf_id}: {e}")
+        return None
+    if not docs:
+        return None
+    docs = [f"{meta['title']} (summary): {doc}" for doc, meta in zip(docs, metas)]
+    return {"documents": [docs], "metadatas": [metas]}
@@ -0,0 +1,268 @@
+"""
+Streaming fine-tuning export: chat history -> sharded, deduplicated JSONL.
+
+Examples are written one at a time; each finished shard is validated in a
+process pool while the next one is being written, and running totals are
+printed as shards complete. Memory stays flat however large the history:
+the dedup index is an on-disk SQLite table next to the shards, which also
+makes re-running the export append only new examples. A shard's hashes are
+committed in the same transaction that records the shard, so an export that
+crashes neither re-emits rows nor loses them.
+
+    python -m app.services.training_export --source memory --out data/training
+    python -m app.services.training_export --source sqlite --db db/chat_history.db --out data/training
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from app.config import BASE_DIR
+
+DEFAULT_SYSTEM = "You are a helpful assistant."
+MAX_REPORTED = 100  # issue messages kept per shard; the counts are always exact
+SHARD_NAME = re.compile(r"shard-(\d+)\.jsonl")
+
+def to_example(conv: Dict) -> Dict:
+    """{"system", "input", "output"} -> chat-format training example."""
+    return {
+        "messages": [
+            {"role": "system", "content": conv.get("system", DEFAULT_SYSTEM)},
+            {"role": "user", "content": conv["input"]},
+            {"role": "assistant", "content": conv["output"]},
+        ]
+    }
+
+def example_hash(example: Dict) -> str:
+    return hashlib.sha1(json.dumps(example, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+# ——— Sources ———
+
+def iter_sqlite_history(db_path: Path, batch: int = 1000) -> Iterator[Dict]:
+    """Rows of the sessions history table (session_id, role, query, answer)."""
+    from app.services.prompts import ROLE_PROMPTS, system_message_for
+
+    with sqlite3.connect(db_path) as conn:
+        cur = conn.execute("SELECT role, query, answer FROM history")
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                break
+            for role, query, answer in rows:
+                role_key = (role or "").lower().strip()
+                system = system_message_for({}, role_key) if role_key in ROLE_PROMPTS else DEFAULT_SYSTEM
+                yield {"system": system, "input": query, "output": answer}
+
+def iter_conversation_memory(page: int = 500) -> Iterator[Dict]:
+    """Question/answer pairs saved by vector_store.save_conversation, one page at a time."""
+    from app.services.vector_store import client
+
+    for name in sorted(getattr(c, "name", c) for c in client.list_collections()):
+        if not name.startswith("conversations_"):
+            continue
+        collection = client.get_collection(name)
+        offset = 0
+        while True:
+            users = collection.get(where={"type": "user_input"}, limit=page, offset=offset,
+                                   include=["documents", "metadatas"])
+            if not users["ids"]:
+                break
+            offset += len(users["ids"])
+            conv_ids = [m["conversation_id"] for m in users["metadatas"]]
+            replies = collection.get(ids=[f"{c}_response" for c in conv_ids], include=["documents"])
+            answers = dict(zip(replies["ids"], replies["documents"]))
+            for conv_id, question in zip(conv_ids, users["documents"]):
+                answer = answers.get(f"{conv_id}_response")
+                if answer:
+                    yield {"input": question, "output": answer}
+
+# ——— Validation ———
+
+def new_stats() -> Dict[str, Any]:
+    return {"total_examples": 0, "input_chars": 0, "output_chars": 0,
+            "format_error_count": 0, "quality_issue_count": 0,
+            "format_errors": [], "quality_issues": []}
+
+def _note(stats: Dict, kind: str, message: str):
+    stats[f"{kind}_count"] += 1
+    if len(stats[f"{kind}s"]) < MAX_REPORTED:
+        stats[f"{kind}s"].append(message)
+
+def check_example(line: str, label: str, stats: Dict):
+    """Validate one JSONL line into running stats."""
+    stats["total_examples"] += 1
+    try:
+        messages = json.loads(line)["messages"]
+        user_msg = next(msg for msg in messages if msg["role"] == "user")
+        assistant_msg = next(msg for msg in messages if msg["role"] == "assistant")
+        input_len = len(user_msg["content"])
+        output_len = len(assistant_msg["content"])
+    except Exception as e:
+        _note(stats, "format_error", f"Example {label}: {str(e)}")
+        return
+    stats["input_chars"] += input_len
+    stats["output_chars"] += output_len
+    if output_len < 10:
+        _note(stats, "quality_issue", f"Example {label}: Very short response")
+    if input_len > 4000:
+        _note(stats, "quality_issue", f"Example {label}: Very long input")
+
+def validate_file(path: str) -> Dict[str, Any]:
+    """Stream one JSONL file; runs in a worker process for shards."""
+    stats = new_stats()
+    name = Path(path).name
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            check_example(line, f"{name}:{i}" if name.startswith("shard-") else str(i), stats)
+    stats["shard"] = name
+    return stats
+
+def merge_stats(total: Dict, part: Dict):
+    for key in ("total_examples", "input_chars", "output_chars", "format_error_count", "quality_issue_count"):
+        total[key] += part[key]
+    for key in ("format_errors", "quality_issues"):
+        total[key].extend(part[key][:max(0, MAX_REPORTED - len(total[key]))])
+
+def finish_stats(stats: Dict) -> Dict:
+    valid = stats["total_examples"] - stats["format_error_count"]
+    stats["avg_input_length"] = stats["input_chars"] / valid if valid else 0
+    stats["avg_output_length"] = stats["output_chars"] / valid if valid else 0
+    return stats
+
+# ——— Export ———
+
+class _Dedup:
+    """Content hashes already exported, and the shards that hold them, kept on disk."""
+
+    def __init__(self, path: Path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS shards (name TEXT PRIMARY KEY)")
+        self.conn.commit()
+
+    def add(self, digest: str) -> bool:
+        """True if the hash is new. Stays uncommitted until its shard is."""
+        return self.conn.execute("INSERT OR IGNORE INTO seen VALUES (?)", (digest,)).rowcount == 1
+
+    def commit_shard(self, name: str):
+        """Record a finished shard together with the hashes of its rows."""
+        self.conn.execute("INSERT OR IGNORE INTO shards VALUES (?)", (name,))
+        self.conn.commit()
+
+    def shards(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT name FROM shards")}
+
+    def close(self):
+        self.conn.close()  # hashes of an unfinished shard are rolled back with it
+
+def _recover_shards(out_dir: Path, dedup: _Dedup) -> int:
+    """Finish shards whose commit landed before a crash, drop those that never committed; next shard number."""
+    committed = dedup.shards()
+    for tmp in out_dir.glob("shard-*.jsonl.tmp"):
+        final = tmp.with_suffix("")
+        if final.name in committed:
+            os.replace(tmp, final)
+        else:
+            tmp.unlink()
+    numbers = [int(m.group(1)) for name in committed | {p.name for p in out_dir.glob("shard-*.jsonl")}
+               if (m := SHARD_NAME.fullmatch(name))]
+    return max(numbers, default=-1) + 1  # never reuse a number, even if earlier shards were deleted
+
+def export_training_data(conversations: Iterable[Dict], out_dir: Path, shard_size: int = 10000,
+                         workers: Optional[int] = None) -> Dict[str, Any]:
+    """Write new examples to out_dir/shard-NNNNN.jsonl and validate each shard in parallel."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    dedup = _Dedup(out_dir / "dedup.sqlite")
+    shard_no = _recover_shards(out_dir, dedup)  # append after earlier runs
+
+    totals = new_stats()
+    counts = {"read": 0, "written": 0, "duplicates": 0, "shards": 0}
+    pending = set()
+
+    def collect(block: bool):
+        nonlocal pending
+        if not pending:
+            return
+        done, pending = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            part = future.result()
+            merge_stats(totals, part)
+            print(f"🧪 {part['shard']}: {part['total_examples']} examples, "
+                  f"{part['format_error_count']} format errors, {part['quality_issue_count']} quality issues "
+                  f"(running total {totals['total_examples']})")
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        shard, shard_path, in_shard = None, None, 0
+
+        def close_shard():
+            nonlocal shard, in_shard
+            shard.flush()
+            os.fsync(shard.fileno())
+            shard.close()
+            shard = None
+            in_shard = 0
+            # rows and hashes become durable together; a crash before the rename
+            # is finished by _recover_shards on the next run
+            final = shard_path.with_suffix("")
+            dedup.commit_shard(final.name)
+            os.replace(shard_path, final)
+            counts["shards"] += 1
+            pending.add(pool.submit(validate_file, str(final)))
+
+        try:
+            for conv in conversations:
+                counts["read"] += 1
+                example = to_example(conv)
+                if not dedup.add(example_hash(example)):
+                    counts["duplicates"] += 1
+                    continue
+                if shard is None:
+                    shard_path = out_dir / f"shard-{shard_no:05d}.jsonl.tmp"
+                    shard_no += 1
+                    shard = open(shard_path, "w", encoding="utf-8")
+                shard.write(json.dumps(example, ensure_ascii=False) + "\n")
+                counts["written"] += 1
+                in_shard += 1
+                if in_shard >= shard_size:
+                    close_shard()
+                    collect(block=False)
+
+            if shard is not None:
+                close_shard()
+        finally:
+            if shard is not None:
+                shard.close()  # left as .tmp with uncommitted hashes; the next run drops it
+            dedup.close()
+        while pending:
+            collect(block=True)
+
+    report = {**counts, "validation": finish_stats(totals)}
+    (out_dir / "manifest.json").write_text(json.dumps(report, indent=2))
+    print(f"✅ Exported {counts['written']} new examples ({counts['duplicates']} duplicates skipped) "
+          f"in {counts['shards']} shards to {out_dir}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", choices=["memory", "sqlite"], default="memory",
+                        help="memory: conversations saved with session_id; sqlite: sessions history table")
+    parser.add_argument("--db", type=Path, help="history database for --source sqlite")
+    parser.add_argument("--out", type=Path, default=Path("data/training"))
+    parser.add_argument("--shard-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None, help="validation processes")
+    args = parser.parse_args()
+
+    if args.source == "sqlite":
+        conversations = iter_sqlite_history(args.db or BASE_DIR / "db/chat_history.db")
+    else:
+        conversations = iter_conversation_memory()
+    export_training_data(conversations, args.out, args.shard_size, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Compressed copies of a collection's vectors for the first, approximate
+# search pass: float16 (2 bytes/dim) or int8 with one scale per dimension
+# (1 byte/dim). Exact float32 vectors stay in Chroma for rescoring.
+
+MODES = ("float16", "int8")
+SCORE_BLOCK = 2048  # rows widened to float32 at a time; small enough to stay in cache
+
+def quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(codes, per-dimension scale or None)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scale = np.abs(vectors).max(axis=0) / 127.0 if len(vectors) else np.ones(vectors.shape[1], np.float32)
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+        return codes, scale.astype(np.float32)
+    raise ValueError(f"Unknown vector compression: {mode}")
+
+def dequantize(codes: np.ndarray, scale: Optional[np.ndarray]) -> np.ndarray:
+    out = codes.astype(np.float32)
+    if scale is not None:
+        out *= scale
+    return out
+
+class CodeIndex:
+    """Brute-force L2 search over compressed codes, a block at a time."""
+
+    def __init__(self, ids: np.ndarray, codes: np.ndarray, scale: Optional[np.ndarray], mode: str):
+        # UTF-8 bytes, not numpy's UCS-4 str: 4x smaller for the ASCII chunk ids
+        # (code files written before this hold str ids)
+        self.ids = ids if ids.dtype.kind == "S" else np.char.encode(ids.astype(str), "utf-8")
+        self.codes = codes
+        self.scale = scale
+        self.mode = mode
+        self.mtime_ns: Optional[int] = None
+        self.sq_norms = np.concatenate(
+            [np.einsum("ij,ij->i", b, b) for b in self._blocks()]) if len(codes) else np.zeros(0, np.float32)
+
+    @classmethod
+    def build(cls, ids, vectors: np.ndarray, mode: str) -> "CodeIndex":
+        codes, scale = quantize(vectors, mode)
+        return cls(np.asarray(ids, dtype=str), codes, scale, mode)
+
+    def _id_strs(self, rows) -> np.ndarray:
+        return np.char.decode(self.ids[rows], "utf-8")
+
+    def _blocks(self):
+        for i in range(0, len(self.codes), SCORE_BLOCK):
+            yield dequantize(self.codes[i:i + SCORE_BLOCK], self.scale)
+
+    def search(self, query_vec, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, approximate squared L2 distances) of the n nearest codes."""
+        q = np.asarray(query_vec, dtype=np.float32)
+        qs = q * self.scale if self.scale is not None else q  # codes . (q * scale) == dequantized . q
+        dots = np.concatenate([self.codes[i:i + SCORE_BLOCK].astype(np.float32) @ qs
+                               for i in range(0, len(self.codes), SCORE_BLOCK)]) \
+            if len(self.codes) else np.zeros(0, np.float32)
+        dist = self.sq_norms - 2 * dots + float(q @ q)
+        n = min(n, len(dist))
+        if n == 0:
+            return self._id_strs(slice(0)), dist[:0]
+        top = np.argpartition(dist, n - 1)[:n]
+        top = top[np.argsort(dist[top])]
+        return self._id_strs(top), dist[top]
+
+    def nbytes(self) -> int:
+        return (self.ids.nbytes + self.codes.nbytes + self.sq_norms.nbytes
+                + (self.scale.nbytes if self.scale is not None else 0))
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp, ids=self.ids, codes=self.codes, mode=np.array(self.mode),
+                 scale=self.scale if self.scale is not None else np.zeros(0, np.float32))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CodeIndex":
+        with np.load(path) as data:
+            scale = data["scale"] if data["scale"].size else None
+            index = cls(data["ids"], data["codes"], scale, str(data["mode"]))
+        index.mtime_ns = path.stat().st_mtime_ns  # lets holders notice a rebuilt file
+        return index
+
+def stored_mode(path: Path) -> Optional[str]:
+    """Mode of the code file at path without loading its codes; None if missing."""
+    try:
+        with np.load(path) as data:
+            return str(data["mode"])
+    except FileNotFoundError:
+        return None
@@ -1,36 +1,317 @@
 import chromadb
-import os
-from app.config import VECTOR_DB_DIR
+import numpy as np
+from app.config import (VECTOR_DB_DIR, EMBEDDING_SOCKET, VECTOR_COMPRESSION, VECTOR_RESCORE_FACTOR,
+                        INDEX_MEMORY_MB, HOT_TEXTBOOKS, ACCESS_HALF_LIFE_DAYS)
+from app.services import vector_codes
+from app.services.residency import ResidencyManager
+import time
 from pathlib import Path
 from datetime import datetime
 import json
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
+import hashlib
 import uuid
 
-VECTOR_DIR = Path("data/vector_store")
+if EMBEDDING_SOCKET:
+    # Store is opened once, by the shared embedding worker
+    from app.services.embedding_worker import WorkerConnection, RemoteChromaClient
+    client = RemoteChromaClient(WorkerConnection(EMBEDDING_SOCKET))
+else:
+    client = chromadb.PersistentClient(path=str(VECTOR_DB_DIR))
 
-client = chromadb.PersistentClient(path=str(VECTOR_DB_DIR))
+# Chroma rejects very large single writes, so bulk writes go in slices
+WRITE_BATCH_SIZE = 1000
+
+def collection_names() -> List[str]:
+    return [getattr(c, "name", c) for c in client.list_collections()]
+
+def existing_collection(name: str):
+    """The named collection, or None; unlike get_or_create_collection it never creates one."""
+    try:
+        return client.get_collection(name)
+    except Exception:
+        return None
+
+def chunk_hash(text: str) -> str:
+    """Stable content hash of a chunk, used as its id and stored in its metadata."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def chunk_ids(pdf_id: str, texts: List[str]) -> List[str]:
+    """Content-addressed ids; repeated chunks get an occurrence suffix."""
+    ids, seen = [], {}
+    for t in texts:
+        h = chunk_hash(t)
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        ids.append(f"{pdf_id}_{h}" if n == 0 else f"{pdf_id}_{h}_{n}")
+    return ids
+
+def _chunk_metadatas(texts, metadatas=None):
+    if not metadatas:
+        metadatas = [{} for _ in texts]
+    for i, (t, m) in enumerate(zip(texts, metadatas)):
+        m["page"] = i + 1  # estimate page number
+        m["hash"] = chunk_hash(t)
+    return metadatas
+
+def _add_batched(collection, ids, documents, embeddings, metadatas):
+    for i in range(0, len(ids), WRITE_BATCH_SIZE):
+        j = i + WRITE_BATCH_SIZE
+        collection.add(ids=ids[i:j], documents=documents[i:j],
+                       embeddings=embeddings[i:j], metadatas=metadatas[i:j])
 
 # Existing PDF functions (keeping your original functionality)
 def save_vectors(pdf_id, texts, vectors, metadatas=None):
     collection = client.get_or_create_collection(pdf_id)
-    if not metadatas:
-        metadatas = [{}] * len(texts)
-    for i, (t, v, m) in enumerate(zip(texts, vectors, metadatas)):
-        m["page"] = i + 1  # estimate page number
-        collection.add(documents=[t], embeddings=[v], metadatas=[m], ids=[f"{pdf_id}_{i}"])
+    metadatas = _chunk_metadatas(texts, metadatas)
+    _add_batched(collection, chunk_ids(pdf_id, texts), list(texts), list(vectors), metadatas)
+
+def plan_sync(pdf_id: str, texts: List[str], metadatas: Optional[List[Dict]] = None) -> Dict[str, Any]:
+    """
+    Work out what sync_vectors would change, without embedding or writing.
+    plan["new_texts"] are the chunks that still need vectors.
+    """
+    collection = client.get_or_create_collection(pdf_id)
+    existing = collection.get(include=["metadatas"])
+    old_meta = dict(zip(existing["ids"], existing["metadatas"]))
+
+    ids = chunk_ids(pdf_id, texts)
+    metadatas = _chunk_metadatas(texts, metadatas)
+    wanted = set(ids)
+    new = [n for n, i in enumerate(ids) if i not in old_meta]
+    return {
+        "pdf_id": pdf_id, "ids": ids, "metadatas": metadatas, "new": new,
+        "new_texts": [texts[n] for n in new],
+        "stale": [i for i in old_meta if i not in wanted],
+        "moved": [n for n, i in enumerate(ids) if i in old_meta and old_meta[i] != metadatas[n]],
+    }
+
+def apply_sync(plan: Dict[str, Any], vectors) -> Dict[str, int]:
+    """Write a plan_sync plan, given one vector per plan["new_texts"]."""
+    pdf_id, ids, metadatas = plan["pdf_id"], plan["ids"], plan["metadatas"]
+    new, stale, moved = plan["new"], plan["stale"], plan["moved"]
+    if new and (vectors is None or len(vectors) != len(new)):
+        raise ValueError(
+            f"Embedding failure: expected {len(new)} vectors, "
+            f"got {len(vectors) if vectors is not None else 0}."
+        )
+    collection = client.get_or_create_collection(pdf_id)
+
+    for i in range(0, len(stale), WRITE_BATCH_SIZE):
+        collection.delete(ids=stale[i:i + WRITE_BATCH_SIZE])
+
+    if new:
+        _add_batched(collection, [ids[n] for n in new], plan["new_texts"],
+                     list(vectors), [metadatas[n] for n in new])
+
+    for i in range(0, len(moved), WRITE_BATCH_SIZE):
+        batch = moved[i:i + WRITE_BATCH_SIZE]
+        collection.update(ids=[ids[n] for n in batch], metadatas=[metadatas[n] for n in batch])
+
+    summary = {"added": len(new), "removed": len(stale), "kept": len(ids) - len(new)}
+    print(f"🔁 Synced {pdf_id}: {summary}")
+    if new or stale:
+        resident.invalidate(pdf_id)
+    if VECTOR_COMPRESSION != "none":
+        if new or stale or vector_codes.stored_mode(codes_path(pdf_id)) != VECTOR_COMPRESSION:
+            build_codes(pdf_id)
+    return summary
+
+def sync_vectors(pdf_id: str, texts: List[str], embed_fn: Callable[[List[str]], List],
+                 metadatas: Optional[List[Dict]] = None) -> Dict[str, int]:
+    """
+    Make a PDF's collection match `texts`, embedding only chunks it doesn't already hold.
+
+    Chunks are keyed by content hash: new ones are embedded with embed_fn and
+    added, ones no longer present are deleted, and unchanged ones are kept
+    (only their position metadata is refreshed).
+    """
+    plan = plan_sync(pdf_id, texts, metadatas)
+    vectors = embed_fn(plan["new_texts"]) if plan["new"] else None
+    return apply_sync(plan, vectors)
+
+# Compressed codes of a collection's embeddings (see services/vector_codes.py),
+# one file per PDF, rebuilt after every sync that changes the collection
+CODES_DIR = VECTOR_DB_DIR / "codes"
+
+def codes_path(pdf_id: str) -> Path:
+    return CODES_DIR / f"{pdf_id}.npz"
+
+def build_codes(pdf_id: str, mode: str = VECTOR_COMPRESSION) -> Dict[str, Any]:
+    """Read the collection's float32 embeddings page by page and write its code file."""
+    collection = client.get_or_create_collection(pdf_id)
+    total = collection.count()
+    ids, matrix = [], None
+    for offset in range(0, total, WRITE_BATCH_SIZE):
+        page = collection.get(include=["embeddings"], limit=WRITE_BATCH_SIZE, offset=offset)
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.empty((total, vectors.shape[1]), dtype=np.float32)
+        matrix[len(ids):len(ids) + len(vectors)] = vectors
+        ids.extend(page["ids"])
+    if matrix is None:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    index = vector_codes.CodeIndex.build(ids, matrix[:len(ids)], mode)
+    index.save(codes_path(pdf_id))
+    resident.invalidate(pdf_id)
+    summary = {"vectors": len(ids), "mode": mode, "float32_bytes": matrix[:len(ids)].nbytes,
+               "code_bytes": index.nbytes()}
+    print(f"🗜️ Codes for {pdf_id}: {summary}")
+    return summary
+
+# Code indexes are held in process under INDEX_MEMORY_MB, the most used
+# books first (services/residency.py). Without compression, Chroma's own HNSW
+# cache serves every query and residency only tracks use for preloading.
+def _resident_index(pdf_id: str):
+    path = codes_path(pdf_id)
+    index = vector_codes.CodeIndex.load(path) if path.exists() else None
+    return index if index is not None and index.mode == VECTOR_COMPRESSION else None
+
+resident = ResidencyManager(INDEX_MEMORY_MB * 2**20, _resident_index,
+                            VECTOR_DB_DIR / "access_stats.json", ACCESS_HALF_LIFE_DAYS)
+
+def preload_hot_textbooks(n: int = HOT_TEXTBOOKS):
+    """
+    Warm the n most used textbooks: load their code indexes and run one
+    query, so Chroma pages in their HNSW index or rescoring rows.
+    """
+    names = set(collection_names())
+    for pdf_id in [p for p in resident.hottest(len(names)) if p in names][:n]:
+        start = time.perf_counter()
+        try:
+            collection = client.get_collection(pdf_id)
+            probe = collection.get(limit=1, include=["embeddings"])
+            if not len(probe["ids"]):
+                continue
+            index = resident.get(pdf_id) if VECTOR_COMPRESSION != "none" else None
+            if index is not None and len(index.ids):
+                _query_codes(collection, index, probe["embeddings"][0], 1)
+            else:
+                collection.query(query_embeddings=[probe["embeddings"][0]], n_results=1, include=[])
+            print(f"🔥 Preloaded {pdf_id} in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"⚠️ Preloading {pdf_id} failed: {e}")
 
 def query_vectors(pdf_id, query_vec, k=10):
     print(f"[VECTOR_STORE] Looking for PDF ID: {pdf_id}")
-    print("[VECTOR_STORE] Available store keys:", os.listdir(VECTOR_DIR))
 
-    collection = client.get_or_create_collection(pdf_id)
+    collection = existing_collection(pdf_id)
+    if collection is None:
+        print(f"⚠️ No vectors stored for {pdf_id}")
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+    resident.touch(pdf_id)
+    index = resident.get(pdf_id) if VECTOR_COMPRESSION != "none" else None
+    if index is not None and _rebuilt_since(index, pdf_id):
+        resident.invalidate(pdf_id)  # rewritten by another process, e.g. bulk_ingest
+        index = resident.get(pdf_id)
+    if index is not None and len(index.ids):
+        return _query_codes(collection, index, query_vec, k)
     return collection.query(
         query_embeddings=[query_vec],
         n_results=k,
-        include=["documents", "metadatas"]
+        include=["documents", "metadatas", "distances"]
     )
 
+def merge_results(per_book: Dict[str, Dict], k: int) -> Dict[str, List[List]]:
+    """
+    The k nearest hits across several books' query results, each metadata
+    tagged with its pdf_id. All books share one embedding model and L2 space,
+    so distances compare directly; hits without one (summary nodes) go first.
+    """
+    rows = []
+    for pdf_id, found in per_book.items():
+        docs, metas = found.get("documents", [[]])[0], found.get("metadatas", [[]])[0]
+        dists = (found.get("distances") or [[]])[0]
+        for i, doc in enumerate(docs):
+            dist = dists[i] if i < len(dists) else float("-inf")
+            rows.append((dist, doc, {**(metas[i] or {}), "pdf_id": pdf_id}))
+    rows.sort(key=lambda row: row[0])
+    rows = rows[:k]
+    return {"documents": [[r[1] for r in rows]], "metadatas": [[r[2] for r in rows]],
+            "distances": [[r[0] for r in rows]]}
+
+def _rebuilt_since(index, pdf_id: str) -> bool:
+    try:
+        return codes_path(pdf_id).stat().st_mtime_ns != index.mtime_ns
+    except FileNotFoundError:
+        return True
+
+def _query_codes(collection, index, query_vec, k):
+    """Shortlist k * VECTOR_RESCORE_FACTOR ids on the codes, then rank them on exact vectors."""
+    candidates, _ = index.search(query_vec, k * max(1, VECTOR_RESCORE_FACTOR))
+    got = collection.get(ids=candidates.tolist(), include=["embeddings", "documents", "metadatas"])
+    if not got["ids"]:
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+    diff = np.asarray(got["embeddings"], dtype=np.float32) - np.asarray(query_vec, dtype=np.float32)
+    dist = np.einsum("ij,ij->i", diff, diff)
+    top = np.argsort(dist)[:k]
+    return {"ids": [[got["ids"][i] for i in top]],
+            "documents": [[got["documents"][i] for i in top]],
+            "metadatas": [[got["metadatas"][i] for i in top]],
+            "distances": [dist[top].tolist()]}
+
+# Summary tree nodes (see services/summaries.py) live in a side collection,
+# so chunk syncs never touch them
+def summary_collection(pdf_id: str, create: bool = True):
+    """The book's summary collection; with create=False, None if it has none."""
+    name = f"{pdf_id}_summaries"
+    return client.get_or_create_collection(name) if create else existing_collection(name)
+
+def get_summary_nodes(pdf_id: str) -> Dict[str, Dict]:
+    """id -> {"document", "metadata"} for every stored summary node."""
+    collection = summary_collection(pdf_id, create=False)
+    if collection is None:
+        return {}
+    got = collection.get(include=["documents", "metadatas"])
+    return {i: {"document": d, "metadata": m}
+            for i, d, m in zip(got["ids"], got["documents"], got["metadatas"])}
+
+def upsert_summary_nodes(pdf_id: str, ids: List[str], documents: List[str],
+                         vectors: List, metadatas: List[Dict]):
+    collection = summary_collection(pdf_id)
+    for i in range(0, len(ids), WRITE_BATCH_SIZE):
+        j = i + WRITE_BATCH_SIZE
+        collection.upsert(ids=ids[i:j], documents=documents[i:j],
+                          embeddings=list(vectors[i:j]), metadatas=metadatas[i:j])
+
+def delete_summary_nodes(pdf_id: str, ids: List[str]):
+    collection = summary_collection(pdf_id)
+    for i in range(0, len(ids), WRITE_BATCH_SIZE):
+        collection.delete(ids=ids[i:i + WRITE_BATCH_SIZE])
+
+def query_summaries(pdf_id: str, query_vec, k: int = 2, levels: Optional[List[str]] = None):
+    """Nearest summary nodes, optionally only from the given levels."""
+    collection = summary_collection(pdf_id, create=False)
+    if collection is None or not collection.count():
+        return {"documents": [[]], "metadatas": [[]]}
+    where = {"level": {"$in": levels}} if levels else None
+    return collection.query(query_embeddings=[query_vec], n_results=k, where=where,
+                            include=["documents", "metadatas"])
+
+def chapter_summary(pdf_id: str, chapter: int) -> Optional[Dict]:
+    """The stored summary of chapter number `chapter`, if there is one."""
+    collection = summary_collection(pdf_id, create=False)
+    if collection is None:
+        return None
+    got = collection.get(
+        where={"$and": [{"level": "chapter"}, {"chapter": chapter}]},
+        include=["documents", "metadatas"])
+    if not got["ids"]:
+        return None
+    return {"document": got["documents"][0], "metadata": got["metadatas"][0]}
+
+def delete_textbook_vectors(pdf_id: str) -> List[str]:
+    """Drop a book's chunk and summary collections and its code file; returns what was removed."""
+    removed = []
+    names = set(collection_names())
+    for name in (pdf_id, f"{pdf_id}_summaries"):
+        if name in names:
+            client.delete_collection(name)
+            removed.append(name)
+    codes_path(pdf_id).unlink(missing_ok=True)
+    resident.invalidate(pdf_id)
+    return removed
+
 # NEW: Conversation Memory Functions
 def save_conversation(session_id: str, user_input: str, assistant_response: str, 
                      user_embedding: List[float], response_embedding: List[float],
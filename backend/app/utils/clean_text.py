@@ -1,7 +1,50 @@
+import re
+from typing import Iterable, Iterator
+
+from emoji import replace_emoji
+from emoji.unicode_codes import EMOJI_DATA
+
+# Every char that can take part in an emoji sequence, plus the variation
+# selectors that replace_emoji drops even when they stand alone.
+_EMOJI_CHARS = set("".join(EMOJI_DATA)) | {"\ufe0e", "\ufe0f"}
+
+# URLs and control chars, or a run of non-ASCII symbols that may hold emoji,
+# found in one scan. Keycap bases (# * 0-9) only count when next to a non-ASCII
+# char. Runs always end next to a char replace_emoji treats as plain text, so
+# handing it just the run gives the same result as handing it the whole text.
+_NOISE = re.compile(
+    r"(http\S+|www\S+|[\x00-\x1F]+)"
+    r"|((?<![#*0-9])[#*0-9]*+[^\x00-\x7F\s][^\x00-\x22\x24-\x29\x2B-\x2F\x3A-\x7F\s]*+)"
+)
+
+def _strip_noise(m: re.Match) -> str:
+    run = m.group(2)
+    if run is None or _EMOJI_CHARS.isdisjoint(run):
+        return run or ""
+    return replace_emoji(run, replace="")
+
 def normalize_text(text: str) -> str:
-    import emoji
-    text = re.sub(r"http\S+|www\S+", "", text)
-    text = emoji.replace_emoji(text, replace="")
-    text = re.sub(r"[\x00-\x1F]+", "", text)  # remove control chars
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
\ No newline at end of file
+    """Remove URLs, emojis, control chars, collapse whitespace."""
+    return " ".join(_NOISE.sub(_strip_noise, text).split())
+
+def normalize_pages(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Normalize a document page by page.
+
+    Pages are treated as if joined with a trailing newline each (as
+    extract_and_clean builds its full text), so
+    "".join(normalize_pages(pages)) == normalize_text("".join(p + "\\n" for p in pages)).
+    """
+    started = False
+    pending_space = False
+    for page in pages:
+        cleaned = _NOISE.sub(_strip_noise, page + "\n")
+        piece = " ".join(cleaned.split())
+        if not piece:
+            pending_space = pending_space or bool(cleaned)
+            continue
+        if started and (pending_space or cleaned[0].isspace()):
+            piece = " " + piece
+        started = True
+        pending_space = cleaned[-1].isspace()
+        yield piece
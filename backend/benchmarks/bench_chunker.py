@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy char-based chunker with app.services.chunker.
+
+Run from backend/:  python -m benchmarks.bench_chunker --pages 2000
+"""
+import argparse
+import re
+import time
+import tracemalloc
+
+from app.services import chunker
+from benchmarks.synthetic import synthetic_book
+
+def legacy_chunk_text(text: str, max_len: int = 500) -> list[str]:
+    """The pre-chunker implementation from pdf_utils, kept here as the baseline."""
+    parts = re.split(r'(?<=[\.!?])\s+', text)
+    sentences = [p.strip() for p in parts if p.strip()]
+    chunks, current = [], ""
+    for sent in sentences:
+        if len(current) + len(sent) + 1 <= max_len:
+            current += sent + " "
+        else:
+            chunks.append(current.strip())
+            current = sent + " "
+    if current:
+        chunks.append(current.strip())
+    return chunks
+
+def measure(name, fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = fn(text)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<10} {len(chunks):>8} chunks  {best:8.3f}s  "
+          f"{len(chunks) / best:>10.0f} chunks/s  {len(text) / 2**20 / best:6.1f} MiB/s  peak {peak / 2**20:7.1f} MiB")
+    return chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-tokens", type=int, default=chunker.CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=chunker.CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    text = synthetic_book(args.pages)
+    tokenizer = "model tokenizer" if chunker._load_tokenizer() else "approximate tokens"
+    print(f"📚 Synthetic book: {args.pages} pages, {len(text) / 2**20:.1f} MiB ({tokenizer})")
+
+    measure("legacy", legacy_chunk_text, text, args.repeat)
+    chunks = measure("chunker", lambda t: chunker.chunk_text(t, args.max_tokens, args.overlap),
+                     text, args.repeat)
+
+    longest = max(len(chunker.token_offsets(c)) for c in chunks)
+    print(f"✅ Longest chunk: {longest} tokens (limit {args.max_tokens - chunker.SPECIAL_TOKENS})")
+
+if __name__ == "__main__":
+    main()
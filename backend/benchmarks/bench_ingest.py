@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Per-stage and end-to-end timing of PDF ingestion on a synthetic textbook.
+
+Stages: extract (PyMuPDF get_text), toc (heading scan), normalize, chunk,
+encode (model.encode) and store (vector_store.save_vectors into a scratch
+Chroma directory). Run from backend/:
+
+    python -m benchmarks.bench_ingest --pages 400
+    python -m benchmarks.bench_ingest --pages 400 --save-baseline benchmarks/baselines/ingest.json
+    python -m benchmarks.bench_ingest --pages 400 --baseline benchmarks/baselines/ingest.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Never write benchmark vectors into the real store
+SCRATCH = Path(tempfile.mkdtemp(prefix="drax-bench-"))
+os.environ["VECTOR_STORE_PATH"] = str(SCRATCH / "vector_store")
+os.environ.pop("EMBEDDING_SOCKET", None)
+
+import fitz  # PyMuPDF
+
+from app.services import pdf_utils
+from app.services.chunker import chunk_text
+from app.utils.clean_text import normalize_pages
+from benchmarks.common import git_commit
+from benchmarks.synthetic import synthetic_pdf
+
+PROC_STATUS = Path("/proc/self/status")
+CLEAR_REFS = Path("/proc/self/clear_refs")
+
+def reset_peak_rss() -> bool:
+    """Restart the peak RSS count from the current RSS (Linux); False where that isn't possible."""
+    try:
+        CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak RSS since the last reset_peak_rss (Linux), else since the process started."""
+    try:
+        return int(re.search(r"VmHWM:\s+(\d+)", PROC_STATUS.read_text()).group(1)) / 2**10
+    except (OSError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def timed(results, name, fn, pages=None, chunks=None):
+    """Run one stage; chunks is a count, or a function of the stage's output for stages that make them."""
+    per_stage = reset_peak_rss()
+    start = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - start
+    entry = {"seconds": elapsed, "peak_rss_mb": round(peak_rss_mb(), 1)}
+    if not per_stage:
+        entry["peak_rss_cumulative"] = True  # no way to reset the peak here; it includes earlier stages
+    if callable(chunks):
+        chunks = chunks(out)
+    if pages:
+        entry["pages_per_s"] = pages / elapsed
+    if chunks:
+        entry["chunks_per_s"] = chunks / elapsed
+    results[name] = entry
+    rate = (f"{entry['pages_per_s']:9.1f} pages/s" if pages else "") + \
+           (f"{entry['chunks_per_s']:9.1f} chunks/s" if chunks else "")
+    print(f"{name:<10} {elapsed:8.3f}s {rate:<34} peak RSS {entry['peak_rss_mb']:7.1f} MiB")
+    return out
+
+def load_encoder():
+    """(get_embeddings, save_vectors), or (None, None) if the model stack isn't installed."""
+    try:
+        from app.services import embedding, vector_store
+        return embedding.get_embeddings, vector_store.save_vectors
+    except (ImportError, OSError) as e:
+        print(f"⚠️ Skipping encode/store stages: {e}")
+        return None, None
+
+def _rate(stage):
+    """Work per second: pages for the PDF stages, chunks for encode/store."""
+    return stage.get("pages_per_s") or stage.get("chunks_per_s")
+
+def check_baseline(report, baseline, tolerance):
+    """Print per-stage throughput change vs the baseline; return names of stages that regressed."""
+    regressed = []
+    print(f"\n📊 vs baseline {baseline.get('commit')} ({baseline.get('timestamp')}), tolerance {tolerance:.0%}")
+    if baseline.get("pages") != report["pages"]:
+        print(f"   ⚠️ baseline has {baseline.get('pages')} pages, this run {report['pages']}; "
+              f"comparing per-page/per-chunk rates, fixed costs make that approximate")
+    for name, stage in report["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            print(f"   ⚠️ {name:<10} not in baseline (recorded without it); re-save the baseline to track it")
+            continue
+        # a slowdown is the baseline's rate over ours; the same work in more time is > 0
+        change = _rate(old) / _rate(stage) - 1
+        flag = "❌" if change > tolerance else "✅"
+        print(f"   {flag} {name:<10} {_rate(old):10.1f}/s -> {_rate(stage):10.1f}/s ({change:+.1%} time per unit)")
+        if change > tolerance:
+            regressed.append(name)
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--pdf", type=Path, help="benchmark this PDF instead of a synthetic one")
+    parser.add_argument("--skip-encode", action="store_true", help="skip encode/store (no model load)")
+    parser.add_argument("--save-baseline", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown per stage")
+    args = parser.parse_args()
+
+    pdf_path = args.pdf or Path(synthetic_pdf(SCRATCH / "bench.pdf", args.pages))
+    encode, save = (None, None) if args.skip_encode else load_encoder()
+
+    stages = {}
+    doc = fitz.open(pdf_path)
+    pages = len(doc)
+    print(f"📚 {pdf_path.name}: {pages} pages")
+
+    texts = timed(stages, "extract", lambda: [p.get_text() for p in doc], pages=pages)
+
+    def scan():
+        seen, chapters = set(), []
+        for page_no, txt in enumerate(texts, start=1):
+            pdf_utils.find_chapters(txt, page_no, seen, chapters)
+        return chapters
+    timed(stages, "toc", scan, pages=pages)
+
+    cleaned = timed(stages, "normalize", lambda: "".join(normalize_pages(texts)), pages=pages)
+    chunks = timed(stages, "chunk", lambda: chunk_text(cleaned), pages=pages)
+    n = len(chunks)
+
+    if encode:
+        vectors = timed(stages, "encode", lambda: encode(chunks), chunks=n)
+        timed(stages, "store", lambda: save("bench-stages", chunks, vectors), chunks=n)
+
+    def end_to_end():
+        c, _ = pdf_utils.extract_and_clean(pdf_path)
+        if encode:
+            save("bench-e2e", c, encode(c))
+        return c
+    # extract_and_clean prunes duplicates, so it stores fewer chunks than the chunk stage made
+    stored = len(timed(stages, "end_to_end", end_to_end, pages=pages, chunks=len))
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count()},
+        "pages": pages,
+        "chunks": n,
+        "chunks_stored": stored,
+        "stages": stages,
+    }
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+        print(f"📁 Baseline written to {args.save_baseline}")
+    if args.baseline:
+        regressed = check_baseline(report, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressed:
+            raise SystemExit(f"❌ Regressed stages: {', '.join(regressed)}")
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare the legacy four-pass normalize_text with app.utils.clean_text.
+
+Run from backend/:  python -m benchmarks.bench_normalize --pages 1000
+"""
+import argparse
+import re
+import time
+
+import emoji
+
+from app.utils import clean_text
+from benchmarks.synthetic import synthetic_pages
+
+def legacy_normalize_text(text: str) -> str:
+    """The pre-clean_text implementation from pdf_utils, kept here as the baseline."""
+    text = re.sub(r"http\S+|www\S+", "", text)
+    text = emoji.replace_emoji(text, replace="")
+    text = re.sub(r"[\x00-\x1F]+", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def measure(name, fn, size, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<10} {best:8.3f}s  {size / 2**20 / best:8.1f} MiB/s")
+    return out, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages)
+    full_text = "".join(p + "\n" for p in pages)
+    print(f"📚 Synthetic book: {args.pages} pages, {len(full_text) / 2**20:.1f} MiB")
+
+    expected, base = measure("legacy", lambda: legacy_normalize_text(full_text),
+                             len(full_text), args.repeat)
+    whole, _ = measure("text", lambda: clean_text.normalize_text(full_text),
+                       len(full_text), args.repeat)
+    paged, best = measure("pages", lambda: "".join(clean_text.normalize_pages(pages)),
+                          len(full_text), args.repeat)
+
+    assert whole == expected, "normalize_text output differs from legacy"
+    assert paged == expected, "normalize_pages output differs from legacy"
+    print(f"✅ Identical output, {base / best:.1f}x faster per page")
+
+if __name__ == "__main__":
+    main()
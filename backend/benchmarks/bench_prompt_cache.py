@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Prefill work saved by the prefix-stable prompt layout under simulated prompt caches.
+
+Replays a mixed stream of RAG questions over several textbooks through the
+cache models in benchmarks.fake_lmstudio and reports prompt tokens that
+still need prefill, and the time that costs at --prefill-tps. "legacy" is
+the old layout (generic system message, everything else in the user turn);
+"prefix" is app.services.prompts. Run from backend/:
+
+    python -m benchmarks.bench_prompt_cache --requests 500 --books 3 --prefill-tps 400
+"""
+import argparse
+import random
+
+from app.services import prompts
+from benchmarks.fake_lmstudio import CACHE_MODES, render_prompt
+from benchmarks.synthetic import WORDS, synthetic_sentence
+
+def synthetic_meta(rng, chapters=8, sections=10):
+    toc = []
+    for c in range(1, chapters + 1):
+        toc.append({"title": f"Chapter {c}: {rng.choice(WORDS).title()} {rng.choice(WORDS)}", "page": c * 40})
+        for s in range(1, sections + 1):
+            toc.append({"title": f"{c}.{s} {rng.choice(WORDS).title()} {rng.choice(WORDS)}",
+                        "page": c * 40 + s * 3})
+    return {"title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Handbook", "chapters": toc}
+
+def legacy_messages(meta, role_key, context, question, list_instr):
+    user = "\n".join(filter(None, [
+        prompts.SYSTEM_INSTRUCTION, prompts.ROLE_PROMPTS[role_key], prompts.toc_note(meta),
+        "Textbook content:", context, f"Question: {question}", list_instr,
+        prompts.ANSWER_INSTRUCTIONS[role_key],
+    ]))
+    return [{"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": user}], None
+
+def prefix_messages(meta, role_key, context, question, list_instr):
+    system = prompts.system_message_for(meta, role_key)
+    user = prompts.rag_user_message(context, question, role_key, list_instr)
+    return [{"role": "system", "content": system},
+            {"role": "user", "content": user}], prompts.cache_key(system)
+
+LAYOUTS = {"legacy": legacy_messages, "prefix": prefix_messages}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--books", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=4, help="cache entries on the server")
+    parser.add_argument("--prefill-tps", type=float, default=400, help="prompt tokens prefilled per second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    books = [synthetic_meta(rng) for _ in range(args.books)]
+    workload = []
+    for _ in range(args.requests):
+        # k=8 retrieved chunks of ~256 tokens, as in rag_agent
+        context = "\n\n".join(" ".join(synthetic_sentence(rng) for _ in range(7)) for _ in range(8))
+        question = synthetic_sentence(rng)
+        list_instr = prompts.LIST_INSTRUCTION if rng.random() < 0.2 else ""
+        workload.append((rng.choice(books), rng.choice(["default", "strict"]), context, question, list_instr))
+
+    print(f"📚 {args.requests} requests over {args.books} books, {args.slots} cache slots, "
+          f"{args.prefill_tps:.0f} prefill tok/s")
+    print(f"{'layout':<8} {'cache':<7} {'prompt tok':>11} {'prefilled':>11} {'cached':>7} {'prefill s':>10} {'per req ms':>11}")
+    for layout, build in LAYOUTS.items():
+        for mode in ["none", *CACHE_MODES]:
+            cache = CACHE_MODES[mode](args.slots) if mode != "none" else None
+            total = cached = 0
+            for meta, role_key, context, question, list_instr in workload:
+                messages, key = build(meta, role_key, context, question, list_instr)
+                total += len(render_prompt(messages)) // 4
+                cached += cache.lookup(messages, key) // 4 if cache else 0
+            prefilled = total - cached
+            seconds = prefilled / args.prefill_tps
+            print(f"{layout:<8} {mode:<7} {total:>11} {prefilled:>11} {cached / total:>6.0%} "
+                  f"{seconds:>10.1f} {seconds / args.requests * 1000:>11.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Memory, transit size and recall of compressed vector codes.
+
+Builds clustered, unit-length synthetic embeddings (MiniLM-sized by default)
+and compares holding them as Python float lists, float32, float16 and int8
+codes (app.services.vector_codes). Recall@k is measured against exact L2
+search, for the codes alone and after exact rescoring of k * --rescore
+candidates, as query_vectors does. In the app the codes are an extra copy:
+Chroma keeps its float32 vectors and HNSW graph for rescoring, so the last
+lines show the memory a book costs with and without them. Code sizes include
+the chunk ids held next to the codes, shaped like the app's ("<pdf uuid>_<sha1>").
+Timings are brute-force scans, not Chroma's HNSW lookup. Run from backend/:
+
+    python -m benchmarks.bench_vectors --vectors 100000 --dim 384 --queries 200
+"""
+import argparse
+import hashlib
+import pickle
+import sys
+import time
+import uuid
+
+import numpy as np
+
+from app.services.vector_codes import MODES, CodeIndex
+
+def clustered_vectors(rng, n, dim, clusters):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def list_bytes(vectors, sample=200):
+    """Estimated size of vectors.tolist(): list objects plus one float object per value."""
+    rows = vectors[:sample].tolist()
+    per_row = sum(sys.getsizeof(r) + sum(sys.getsizeof(x) for x in r) for r in rows) / len(rows)
+    return int(per_row * len(vectors) + sys.getsizeof([None] * len(vectors)))
+
+def exact_top(vectors, q, k, sq_norms):
+    dist = sq_norms - 2 * (vectors @ q)
+    top = np.argpartition(dist, k - 1)[:k]
+    return top[np.argsort(dist[top])]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=4, help="candidates rescored per result")
+    parser.add_argument("--batch", type=int, default=64, help="vectors per embedding call, for transit size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(rng, args.vectors, args.dim, args.clusters)
+    picks = rng.integers(0, args.vectors, args.queries)
+    queries = vectors[picks] + rng.normal(scale=0.05, size=(args.queries, args.dim)).astype(np.float32)
+    pdf_id = str(uuid.UUID(int=int(rng.integers(2**62))))
+    ids = [f"{pdf_id}_{hashlib.sha1(f'chunk {i}'.encode()).hexdigest()}" for i in range(args.vectors)]
+    row_of = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    truth = [set(exact_top(vectors, q, args.k, sq_norms)) for q in queries]
+
+    batch = vectors[:args.batch]
+    print(f"📐 {args.vectors} vectors x {args.dim} dims, {args.queries} queries, recall@{args.k}")
+    print(f"🚚 one {args.batch}-vector embedding reply pickled: "
+          f"list {len(pickle.dumps(batch.tolist())) / 1024:.0f} KiB, "
+          f"float32 array {len(pickle.dumps(batch)) / 1024:.0f} KiB")
+
+    print(f"{'format':<10} {'MiB':>8} {'vs list':>8} {'recall':>7} {'rescored':>9} {'ms/query':>9}")
+    listed = list_bytes(vectors)
+    print(f"{'list':<10} {listed / 2**20:>8.1f} {1:>7.1f}x {'':>7} {'':>9} {'':>9}")
+
+    start = time.perf_counter()
+    for q in queries:
+        exact_top(vectors, q, args.k, sq_norms)
+    ms = (time.perf_counter() - start) / args.queries * 1000
+    print(f"{'float32':<10} {vectors.nbytes / 2**20:>8.1f} {listed / vectors.nbytes:>7.1f}x "
+          f"{1:>7.3f} {'':>9} {ms:>9.2f}")
+
+    extra = {}
+    for mode in MODES:
+        index = CodeIndex.build(ids, vectors, mode)
+        hits = rescored_hits = 0
+        start = time.perf_counter()
+        for q, want in zip(queries, truth):
+            found, _ = index.search(q, args.k * args.rescore)
+            rows = np.array([row_of[chunk_id] for chunk_id in found])
+            diff = vectors[rows] - q
+            best = rows[np.argsort(np.einsum("ij,ij->i", diff, diff))[:args.k]]
+            hits += len(want & set(rows[:args.k]))
+            rescored_hits += len(want & set(best))
+        ms = (time.perf_counter() - start) / args.queries * 1000
+        total = args.queries * args.k
+        print(f"{mode:<10} {index.nbytes() / 2**20:>8.1f} {listed / index.nbytes():>7.1f}x "
+              f"{hits / total:>7.3f} {rescored_hits / total:>9.3f} {ms:>9.2f}")
+        extra[mode] = index.nbytes()
+    print(f"🏷️ of which {index.ids.nbytes / 2**20:.1f} MiB are chunk ids ({index.ids.itemsize} bytes each)")
+
+    print(f"⚠️ Codes are held on top of Chroma's float32 vectors (plus its HNSW graph), not instead of them:")
+    for mode, size in extra.items():
+        print(f"   {mode}: {vectors.nbytes / 2**20:.1f} MiB float32 + {size / 2**20:.1f} MiB codes = "
+              f"{(vectors.nbytes + size) / 2**20:.1f} MiB held ({size / vectors.nbytes:+.0%} vs none)")
+
+if __name__ == "__main__":
+    main()
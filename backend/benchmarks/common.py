@@ -0,0 +1,18 @@
+import subprocess
+
+def git_commit():
+    """Short hash of the checked-out commit, so reports can be compared across commits."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of values (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
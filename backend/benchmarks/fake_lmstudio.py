@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible stand-in for LM Studio with controllable speed and failures.
+
+Run from backend/:
+    python -m benchmarks.fake_lmstudio --port 1235 --ttft-ms 300 --tps 40 --error-rate 0.02
+    LMSTUDIO_API=http://localhost:1235/v1/chat/completions python -m uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = "the model uses context from the textbook to answer each question clearly".split()
+
+def render_prompt(messages) -> str:
+    """Flatten chat messages the way a chat template would, in order."""
+    return "".join(f"<|{m.get('role')}|>{m.get('content', '')}" for m in messages)
+
+class PrefixCache:
+    """
+    Rough model of a token-prefix KV cache with a few slots (llama.cpp style):
+    a prompt only needs prefill after its longest common prefix with a
+    recently seen prompt.
+    """
+
+    def __init__(self, slots: int = 4):
+        self.slots = slots
+        self.prompts = []
+
+    def lookup(self, messages, cache_key=None) -> int:
+        """Cached characters for this request; remembers it as the most recent prompt."""
+        prompt = render_prompt(messages)
+        best, best_i = 0, None
+        for i, seen in enumerate(self.prompts):
+            n = len(os.path.commonprefix([seen, prompt]))
+            if n > best:
+                best, best_i = n, i
+        if best_i is not None:
+            del self.prompts[best_i]
+        elif len(self.prompts) >= self.slots:
+            self.prompts.pop(0)
+        self.prompts.append(prompt)
+        return best
+
+class SystemPromptCache:
+    """
+    Model of a cache that only reuses a leading system message, keyed by the
+    request's prompt_cache_key (or the system text itself).
+    """
+
+    def __init__(self, slots: int = 4):
+        self.slots = slots
+        self.keys = []
+
+    def lookup(self, messages, cache_key=None) -> int:
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        system = render_prompt(messages[:1])
+        key = cache_key or system
+        hit = key in self.keys
+        if hit:
+            self.keys.remove(key)
+        elif len(self.keys) >= self.slots:
+            self.keys.pop(0)
+        self.keys.append(key)
+        return len(system) if hit else 0
+
+CACHE_MODES = {"prefix": PrefixCache, "system": SystemPromptCache}
+
+def prefill_seconds(prompt_tokens: int) -> float:
+    return prompt_tokens / settings.prefill_tps if settings.prefill_tps else 0.0
+
+class Settings:
+    model = "fake-model"
+    ttft_ms = 200.0
+    tps = 50.0
+    completion_tokens = 64
+    error_rate = 0.0
+    error_status = 500
+    prefill_tps = 0.0
+    cache_slots = 0
+    cache_mode = "prefix"
+
+settings = Settings()
+stats = {"requests": 0, "streamed": 0, "errors": 0, "completion_tokens": 0,
+         "prompt_tokens": 0, "cached_prompt_tokens": 0}
+cache = PrefixCache()
+
+app = FastAPI()
+
+def _completion_tokens(body):
+    n = min(settings.completion_tokens, int(body.get("max_tokens") or settings.completion_tokens))
+    return [WORDS[i % len(WORDS)] + " " for i in range(n)]
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": settings.model, "object": "model"}]}
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": "injected failure"}, status_code=settings.error_status)
+
+    tokens = _completion_tokens(body)
+    messages = body.get("messages", [])
+    prompt = render_prompt(messages)
+    cached_chars = cache.lookup(messages, body.get("prompt_cache_key")) if settings.cache_slots else 0
+    # ~4 characters per token
+    prompt_tokens, cached_tokens = len(prompt) // 4, cached_chars // 4
+    ttft = settings.ttft_ms / 1000 + prefill_seconds(prompt_tokens - cached_tokens)
+    stats["prompt_tokens"] += prompt_tokens
+    stats["cached_prompt_tokens"] += cached_tokens
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    model = body.get("model") or settings.model
+    stats["completion_tokens"] += len(tokens)
+
+    if body.get("stream"):
+        stats["streamed"] += 1
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for i, tok in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(1 / settings.tps)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(ttft + max(len(tokens) - 1, 0) / settings.tps)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                     "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                  "total_tokens": prompt_tokens + len(tokens),
+                  "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+    }
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1235)
+    parser.add_argument("--model", default=settings.model)
+    parser.add_argument("--ttft-ms", type=float, default=settings.ttft_ms,
+                        help="time to first token, on top of any prefill time")
+    parser.add_argument("--prefill-tps", type=float, default=settings.prefill_tps,
+                        help="prompt tokens prefilled per second (0 = free)")
+    parser.add_argument("--cache-slots", type=int, default=settings.cache_slots,
+                        help="entries kept in the simulated prompt cache (0 = no cache)")
+    parser.add_argument("--cache-mode", choices=sorted(CACHE_MODES), default=settings.cache_mode,
+                        help="prefix: longest shared token prefix; system: keyed system message only")
+    parser.add_argument("--tps", type=float, default=settings.tps, help="generated tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=settings.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=settings.error_rate, help="fraction of requests to fail")
+    parser.add_argument("--error-status", type=int, default=settings.error_status)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for name in ("model", "ttft_ms", "tps", "completion_tokens", "error_rate", "error_status",
+                 "prefill_tps", "cache_slots", "cache_mode"):
+        setattr(settings, name, getattr(args, name))
+    global cache
+    cache = CACHE_MODES[args.cache_mode](args.cache_slots)
+    random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: upload -> embed -> chat against a running backend.
+
+Run from backend/ (with the API pointed at benchmarks.fake_lmstudio for
+repeatable numbers):
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --out report.json
+    python -m benchmarks.load_test --requests 200 --concurrency 16 --compare report.json
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from benchmarks.common import git_commit, percentile
+from benchmarks.synthetic import synthetic_pdf
+
+QUERIES = [
+    "What is a transformer encoder?",
+    "Summarize chapter 1.",
+    "List the main types of activation function.",
+    "How does the optimizer use the learning rate?",
+    "Explain attention in simple terms.",
+]
+
+def summarize(results, wall):
+    """results: list of (ok, latency_seconds)."""
+    latencies = [lat * 1000 for ok, lat in results if ok]
+    errors = sum(1 for ok, _ in results if not ok)
+    return {
+        "count": len(results),
+        "errors": errors,
+        "error_rate": errors / len(results) if results else 0.0,
+        "wall_s": wall,
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": statistics.fmean(latencies) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+    }
+
+def run_stage(name, fn, jobs, concurrency):
+    def timed(job):
+        start = time.perf_counter()
+        try:
+            ok, value = fn(job)
+        except requests.RequestException as e:
+            ok, value = False, str(e)
+        return ok, time.perf_counter() - start, value
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, jobs))
+    wall = time.perf_counter() - start
+
+    stage = summarize([(ok, lat) for ok, lat, _ in outcomes], wall)
+    lat = stage["latency_ms"]
+    print(f"{name:<7} {stage['count']:>5} reqs  {stage['throughput_rps']:7.2f} req/s  "
+          f"p50 {lat['p50'] or 0:8.1f}ms  p95 {lat['p95'] or 0:8.1f}ms  p99 {lat['p99'] or 0:8.1f}ms  "
+          f"errors {stage['errors']}")
+    return stage, [value for ok, _, value in outcomes if ok]
+
+def compare(report, baseline):
+    print(f"\n📊 vs baseline {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for name, stage in report["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        for key in ("p50", "p95", "p99"):
+            new_v, old_v = stage["latency_ms"][key], old["latency_ms"][key]
+            if new_v and old_v:
+                print(f"   {name:<7} {key}: {old_v:8.1f} -> {new_v:8.1f} ms ({(new_v - old_v) / old_v:+.1%})")
+        print(f"   {name:<7} throughput: {old['throughput_rps']:.2f} -> {stage['throughput_rps']:.2f} req/s, "
+              f"error rate: {old['error_rate']:.2%} -> {stage['error_rate']:.2%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000/api")
+    parser.add_argument("--pdf", type=Path, help="PDF to upload (default: generate a synthetic one)")
+    parser.add_argument("--pages", type=int, default=50, help="pages in the synthetic PDF")
+    parser.add_argument("--uploads", type=int, default=1, help="copies of the PDF to upload and embed")
+    parser.add_argument("--pdf-id", action="append", default=[],
+                        help="chat against an already embedded pdf_id instead of uploading")
+    parser.add_argument("--requests", type=int, default=100, help="chat requests to send")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--role", default="default")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--out", type=Path, help="write the JSON report here")
+    parser.add_argument("--compare", type=Path, help="JSON report from an earlier run to compare with")
+    args = parser.parse_args()
+
+    base = args.base_url.rstrip("/")
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "config": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        "stages": {},
+    }
+
+    pdf_ids = list(args.pdf_id)
+    if not pdf_ids:
+        pdf_path = args.pdf or Path(synthetic_pdf(Path(tempfile.mkdtemp()) / "loadtest.pdf", args.pages))
+
+        def upload(_):
+            with open(pdf_path, "rb") as f:
+                r = requests.post(f"{base}/uploads", files={"file": (pdf_path.name, f, "application/pdf")},
+                                  timeout=args.timeout)
+            return r.ok, r.json().get("pdf_id") if r.ok else r.text
+
+        def embed(pdf_id):
+            r = requests.post(f"{base}/embed/{pdf_id}", timeout=args.timeout)
+            return r.ok, pdf_id
+
+        report["stages"]["upload"], uploaded = run_stage("upload", upload, range(args.uploads), args.concurrency)
+        report["stages"]["embed"], pdf_ids = run_stage("embed", embed, uploaded, args.concurrency)
+        if not pdf_ids:
+            raise SystemExit("❌ No PDF was uploaded and embedded; is the backend running?")
+
+    def chat(i):
+        payload = {"query": QUERIES[i % len(QUERIES)], "role": args.role, "pdf_id": pdf_ids[i % len(pdf_ids)]}
+        r = requests.post(f"{base}/chat/", json=payload, timeout=args.timeout)
+        # LLM failures come back as 200 with an "Error: ..." answer
+        return r.ok and not r.json().get("answer", "").startswith("Error:"), None
+
+    report["stages"]["chat"], _ = run_stage("chat", chat, range(args.requests), args.concurrency)
+
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+        print(f"📁 Report written to {args.out}")
+    if args.compare:
+        compare(report, json.loads(args.compare.read_text()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import random
+
+WORDS = (
+    "model data network layer training gradient loss function vector matrix "
+    "probability distribution sample token sequence attention transformer encoder "
+    "decoder generation latent space image text learning rate optimizer batch "
+    "parameter weight bias activation output input feature representation"
+).split()
+
+NOISE = ["https://example.com/ch1", "www.example.org", "\U0001F600", "\u2705", "\x0c", "\t", "\u00a9"]
+
+def synthetic_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 28))]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice(".!?")
+
+def synthetic_page(rng: random.Random, sentences: int = 40) -> str:
+    """One page as PyMuPDF returns it: short lines, the odd URL, emoji and control char."""
+    words = " ".join(synthetic_sentence(rng) for _ in range(sentences)).split(" ")
+    for _ in range(3):
+        words.insert(rng.randrange(len(words)), rng.choice(NOISE))
+    lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+    return "\n".join(lines) + "\n"
+
+def synthetic_pages(pages: int = 500, seed: int = 0) -> list[str]:
+    """Raw per-page text of a fake textbook."""
+    rng = random.Random(seed)
+    return [synthetic_page(rng) for _ in range(pages)]
+
+def synthetic_book(pages: int = 500, seed: int = 0) -> str:
+    """Cleaned, single-spaced text of a fake textbook."""
+    rng = random.Random(seed)
+    return " ".join(
+        " ".join(synthetic_sentence(rng) for _ in range(40))
+        for _ in range(pages)
+    )
+
+EXERCISE_SHEET = (
+    "Exercises for chapter {ch}. Work through each problem below before checking the worked answers "
+    "in the appendix. For every exercise state the model, the loss function and the optimizer you chose, "
+    "explain how the learning rate and batch size affect training, and report the output of each layer. "
+    "Problems marked with a star are harder and may need the attention and encoder sections. "
+    "Show all intermediate steps, label every matrix and vector with its shape, and justify each answer "
+    "in one or two sentences. Submit your answers by the end of week {week} using the course template. "
+    "Group work is allowed for the starred problems only; list your partners at the top of the sheet. "
+    "Late submissions lose ten percent per day unless arranged in advance with the teaching staff, and "
+    "answers copied from the solutions manual receive no credit. Use the forum for questions about the "
+    "wording of a problem, not for sharing answers, and check the errata page before asking."
+)
+
+def synthetic_pdf(path, pages: int = 50, seed: int = 0, boilerplate: bool = False) -> str:
+    """
+    Write a fake textbook PDF with chapter/section headings; returns the path.
+    With boilerplate, pages get a running header, a page-number footer and a
+    copyright line, and every chapter ends with the same templated exercise sheet,
+    reflowed at a different width so its lines differ from chapter to chapter.
+    """
+    import fitz  # PyMuPDF
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        chapter = page_no // 10 + 1
+        if boilerplate:
+            page.insert_text((72, 40), f"Synthetic Textbook - Chapter {chapter}", fontsize=8)
+            page.insert_text((72, 800), f"Page {page_no + 1}", fontsize=8)
+            page.insert_text((300, 800), "(c) 2024 Benchmark Press. All rights reserved.", fontsize=8)
+            if page_no % 10 == 9:
+                page.insert_textbox(fitz.Rect(72, 72, 540 - 40 * (chapter % 5), 770),
+                                    EXERCISE_SHEET.format(ch=chapter, week=chapter + 1), fontsize=10)
+                continue
+        heading = f"Chapter {chapter}: {rng.choice(WORDS).title()}" if page_no % 10 == 0 \
+            else f"{chapter}.{page_no % 10} {rng.choice(WORDS).title()} {rng.choice(WORDS)}"
+        body = " ".join(synthetic_sentence(rng) for _ in range(30))
+        page.insert_text((72, 72), heading, fontsize=14)
+        page.insert_textbox(fitz.Rect(72, 96, 540, 770), body, fontsize=10)
+    doc.set_metadata({"title": f"Synthetic Textbook ({pages} pages)", "author": "Benchmark"})
+    doc.save(str(path))
+    doc.close()
+    return str(path)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
-import pandas as pd
+import csv
 import json
+import os
 from pathlib import Path
 
 # ─── Compute paths ───────────────────────────────────────────────────────────
@@ -9,21 +10,44 @@ BACKEND_DIR = THIS_FILE.parent           # <project-root>/backend
 CSV_PATH    = BACKEND_DIR / "data" / "generated_prompts.csv"
 OUT_PATH    = BACKEND_DIR / "app" / "prompts" / "tutor_examples.json"
 
-# ─── Load CSV ────────────────────────────────────────────────────────────────
+# ─── Open CSV ────────────────────────────────────────────────────────────────
 if not CSV_PATH.exists():
     print(f"❌ CSV not found at {CSV_PATH}")
     exit(1)
 
-df = pd.read_csv(CSV_PATH)
-if "question" not in df.columns or "answer" not in df.columns:
-    print("❌ CSV must have 'question' and 'answer' columns. Found:", df.columns.tolist())
+csv_file = open(CSV_PATH, newline="", encoding="utf-8")
+reader = csv.DictReader(csv_file)
+if "question" not in (reader.fieldnames or []) or "answer" not in reader.fieldnames:
+    print("❌ CSV must have 'question' and 'answer' columns. Found:", reader.fieldnames)
     exit(1)
 
-records = df[["question", "answer"]].to_dict(orient="records")
-
-# ─── Write JSON ─────────────────────────────────────────────────────────────
+# ─── Stream rows into the JSON file (and the index builder) ─────────────────
 OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-with open(OUT_PATH, "w") as f:
-    json.dump(records, f, indent=2)
+tmp_path = OUT_PATH.with_name(OUT_PATH.name + ".tmp")
+count = 0
+
+def records():
+    """Yield each example while writing it, so no step holds the whole CSV."""
+    global count
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for row in reader:
+            record = {"question": row["question"], "answer": row["answer"]}
+            out.write(("," if count else "") + "\n  " + json.dumps(record))
+            count += 1
+            yield record
+        out.write("\n]\n")
+    os.replace(tmp_path, OUT_PATH)
+
+# ─── Rebuild the few-shot index incrementally ────────────────────────────────
+try:
+    from app.services import embedding, fewshot
+except (ImportError, OSError) as e:
+    print(f"⚠️ Embedding model unavailable ({e}); writing examples without the few-shot index")
+    for _ in records():
+        pass
+else:
+    fewshot.build_index(records(), embedding.get_embeddings)
 
-print(f"✅ Wrote {len(records)} examples to {OUT_PATH}")
\ No newline at end of file
+csv_file.close()
+print(f"✅ Wrote {count} examples to {OUT_PATH}")
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# vector_store opens its Chroma directory on import; keep tests out of data/
+os.environ.setdefault("VECTOR_STORE_PATH", tempfile.mkdtemp(prefix="drax-test-store-"))
@@ -0,0 +1,44 @@
+import pytest
+
+from app.services import chunker
+
+tokenizers = pytest.importorskip("tokenizers")
+
+def bert_like_tokenizer():
+    """Tiny WordPiece tokenizer with MiniLM's normalizer and pre-tokenizer."""
+    vocab = {"[UNK]": 0, "the": 1, "end": 2, ".": 3, "next": 4, "word": 5}
+    tok = tokenizers.Tokenizer(tokenizers.models.WordPiece(vocab, unk_token="[UNK]"))
+    tok.normalizer = tokenizers.normalizers.BertNormalizer(lowercase=True)
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.BertPreTokenizer()
+    return tok
+
+@pytest.fixture
+def model_tokenizer(monkeypatch):
+    tok = bert_like_tokenizer()
+    monkeypatch.setattr(chunker, "_load_tokenizer", lambda: tok)
+    return tok
+
+@pytest.mark.parametrize("tail", ["­", "​", "�", "\x7f"])
+def test_characters_the_normalizer_drops_are_not_truncation(model_tokenizer, tail):
+    text = "the end. next word" + tail
+    assert chunker.token_offsets(text)[-1] == (14, 18)
+    assert chunker.chunk_text(text) == ["the end. next word"]
+
+def test_truncating_tokenizer_is_refused(model_tokenizer):
+    model_tokenizer.enable_truncation(3)
+    with pytest.raises(RuntimeError):
+        chunker.chunk_spans("the end. next word the end")
+
+def test_approximate_tokens_match_the_regex(monkeypatch):
+    monkeypatch.setattr(chunker, "_load_tokenizer", lambda: None)
+    text = "Ünïcode wörds — “quotes” 😀 a.b end.­ next! x_y 3.14 日本語。\ttab\n"
+    assert chunker.token_offsets(text) == [m.span() for m in chunker.APPROX_TOKEN.finditer(text)]
+
+def test_windows_give_the_same_spans(monkeypatch):
+    monkeypatch.setattr(chunker, "_load_tokenizer", lambda: None)
+    text = " ".join(f"Sentence {i} has a few words in it{'!' if i % 3 else '.'}" for i in range(2000))
+    whole = chunker.chunk_spans(text, 64, 8, window_chars=len(text))
+    assert len(whole) > 10
+    for window in (4096, 500, 7):
+        assert chunker.chunk_spans(text, 64, 8, window_chars=window) == whole
+    assert max(len(chunker.token_offsets(text[s:e])) for s, e in whole) <= 64 - chunker.SPECIAL_TOKENS
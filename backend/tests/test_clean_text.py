@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from app.utils.clean_text import normalize_pages, normalize_text
+from benchmarks.bench_normalize import legacy_normalize_text
+from benchmarks.synthetic import synthetic_pages
+
+CASES = [
+    "",
+    "   \n\t ",
+    "Plain text.  With   spaces\nand lines.",
+    "See https://example.com/a?b=1 and www.example.org, then more.",
+    "ctrl\x00chars\x07in\x1fthe\x0bmiddle",
+    "Emoji 😀 and family 👨‍👩‍👧 and flag 🇫🇷 end",
+    "Keycaps #️⃣ 1️⃣ *️⃣ but #1 and 2* stay",
+    "Lone selectors ️︎ and text style ☺︎",
+    "Ünïcode wörds — “quotes” 日本語。 café ✓ © ™ ★",
+    "url-adjacent😀http://x.y/😀 www.z😀",
+]
+
+@pytest.mark.parametrize("text", CASES)
+def test_normalize_text_matches_legacy(text):
+    assert normalize_text(text) == legacy_normalize_text(text)
+
+def test_random_mixtures_match_legacy():
+    rng = random.Random(0)
+    alphabet = list("ab #*019.,!?-\n\t\x01") + ["😀", "👍🏽", "‍", "️", "⃣", "🇫", "🇷", "é", "—", "http://u.v/", "www."]
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        assert normalize_text(text) == legacy_normalize_text(text), repr(text)
+
+@pytest.mark.parametrize("pages", [
+    ["first page", "", "  ", "second 😀", "\n", "third\x02"],
+    ["ends with space ", " starts with space", "😀", "joined"],
+    [c for c in CASES],
+    synthetic_pages(20),
+])
+def test_normalize_pages_matches_legacy_on_joined_text(pages):
+    joined = "".join(p + "\n" for p in pages)
+    assert "".join(normalize_pages(pages)) == legacy_normalize_text(joined)
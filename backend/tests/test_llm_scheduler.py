@@ -0,0 +1,22 @@
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, QueueFull
+
+def test_batch_backlog_does_not_reject_interactive_calls():
+    scheduler = LLMScheduler(max_concurrent=1, max_queue=2, max_batch_queue=3)
+    assert scheduler._enqueue("batch", "eval") is None  # takes the only slot
+    for _ in range(3):
+        scheduler._enqueue("batch", "eval")
+    with pytest.raises(QueueFull):
+        scheduler._enqueue("batch", "eval")
+
+    interactive = [scheduler._enqueue("interactive", f"student-{i}") for i in range(2)]
+    assert all(t is not None for t in interactive)
+    with pytest.raises(QueueFull) as full:
+        scheduler._enqueue("interactive", "student-2")
+    # only the interactive waiters are ahead of a new interactive call
+    assert full.value.retry_after == 3
+
+    scheduler._release(1.0)  # the running batch call ends; interactive goes first
+    assert interactive[0].event.is_set()
+    assert scheduler.stats()["queued"] == {"interactive": 1, "batch": 3}
@@ -0,0 +1,16 @@
+import time
+
+from app.services import catalog, maintenance, snapshots, vector_store
+
+def test_only_stale_import_staging_collections_are_orphans(monkeypatch, tmp_path):
+    fresh = f"import-{int(time.time()) - 60}-0123456789ab"
+    stale = f"import-{int(time.time() - snapshots.STAGING_GRACE_S) - 60}-0123456789ab"
+    names = ["book", "book_summaries", fresh, f"{fresh}_summaries", stale, f"{stale}_summaries",
+             "import-0123456789abcdef", "conversations_book"]
+    monkeypatch.setattr(vector_store, "collection_names", lambda: names)
+    monkeypatch.setattr(vector_store, "CODES_DIR", tmp_path / "codes")
+    monkeypatch.setattr(catalog, "load_catalog", lambda: {"book": {}})
+    monkeypatch.setattr(maintenance, "UPLOAD_DIR", tmp_path)
+
+    orphans = maintenance.find_orphans()
+    assert orphans["collections"] == sorted([stale, f"{stale}_summaries", "import-0123456789abcdef"])
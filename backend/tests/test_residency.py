@@ -0,0 +1,37 @@
+import hashlib
+
+import numpy as np
+
+from app.services.residency import ResidencyManager
+from app.services.vector_codes import CodeIndex
+
+def book_index(pdf_id, n=200, dim=32):
+    ids = [f"{pdf_id}_{hashlib.sha1(f'{pdf_id} {i}'.encode()).hexdigest()}" for i in range(n)]
+    vectors = np.random.default_rng(len(pdf_id)).normal(size=(n, dim)).astype(np.float32)
+    return CodeIndex.build(ids, vectors, "int8")
+
+PDF_IDS = [f"{i:08d}-0000-4000-8000-000000000000" for i in range(6)]
+
+def test_nbytes_counts_ids():
+    index = book_index(PDF_IDS[0])
+    assert index.ids.itemsize == 77  # one byte per character, not numpy's four
+    assert index.nbytes() == index.ids.nbytes + index.codes.nbytes + index.sq_norms.nbytes + index.scale.nbytes
+    found, _ = index.search(index.codes[3].astype(np.float32) * index.scale, 1)
+    assert found.tolist() == [f"{PDF_IDS[0]}_{hashlib.sha1(f'{PDF_IDS[0]} 3'.encode()).hexdigest()}"]
+
+def test_resident_indexes_stay_within_budget(tmp_path):
+    size = book_index(PDF_IDS[0]).nbytes()
+    manager = ResidencyManager(int(size * 2.5), book_index, tmp_path / "access.json")
+    for pdf_id in PDF_IDS + PDF_IDS[::-1]:
+        assert manager.get(pdf_id) is not None
+        assert manager.used == sum(i.nbytes() for i in manager.resident.values()) <= manager.budget
+    assert len(manager.resident) == 2
+
+    # a second load of a resident book returns it without counting it again
+    used = manager.used
+    assert manager._load(PDF_IDS[0]) is manager.resident[PDF_IDS[0]]
+    assert manager.used == used
+
+    for pdf_id in list(manager.resident):
+        manager.invalidate(pdf_id)
+    assert manager.used == 0